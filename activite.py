@@ -0,0 +1,119 @@
+"""Cumuls d'activité par jour et par heure, pour les graphiques temporels.
+
+Un document de la collection activite compte les événements d'une métrique
+(votes, questions) sur une période (jour ou heure tronqués), pour une question
+ou pour l'ensemble (id_question à None). Les compteurs sont incrémentés par
+$inc à chaque écriture ; reconstruire_activite les recalcule depuis
+l'historique. Un graphique lit au plus quelques centaines de petits documents,
+quel que soit le volume de votes.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from pymongo import UpdateOne
+
+GRANULARITES = ("jour", "heure")
+# Champ de date et suivi par question de chaque métrique
+METRIQUES = {
+    "votes": {"collection": "vote", "date": "date_vote", "par_question": True},
+    "questions": {"collection": "question", "date": "date_creation", "par_question": False},
+}
+TAILLE_LOT = 1000
+
+
+def tronquer(date, granularite):
+    """Début du jour ou de l'heure contenant date"""
+    if granularite == "jour":
+        return date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return date.replace(minute=0, second=0, microsecond=0)
+
+
+def _cles(metrique, date, question_id):
+    """(question, granularité, période) touchées par un événement : global et, si suivi, par question"""
+    questions = [None]
+    if METRIQUES[metrique]["par_question"] and question_id is not None:
+        questions.append(question_id)
+    return [
+        (question, granularite, tronquer(date, granularite))
+        for question in questions
+        for granularite in GRANULARITES
+    ]
+
+
+def operations_activite(metrique, evenements):
+    """Mises à jour $inc pour des événements [(date, question_id)], une par compteur touché"""
+    deltas = Counter()
+    for date, question_id in evenements:
+        for cle in _cles(metrique, date, question_id):
+            deltas[cle] += 1
+    return [
+        UpdateOne(
+            {"metrique": metrique, "id_question": question, "granularite": granularite, "periode": periode},
+            {"$inc": {"nombre": nombre}},
+            upsert=True
+        )
+        for (question, granularite, periode), nombre in deltas.items()
+    ]
+
+
+def incrementer_activite(db, metrique, date, question_id=None):
+    """Compter un événement (création de question...) dans les cumuls"""
+    db.activite.bulk_write(operations_activite(metrique, [(date, question_id)]), ordered=False)
+
+
+def serie_activite(db, metrique, granularite, depuis=None, question_id=None):
+    """[(période, nombre)] par ordre chronologique, depuis une date (incluse) ou depuis toujours"""
+    filtre = {"metrique": metrique, "id_question": question_id, "granularite": granularite}
+    if depuis is not None:
+        filtre["periode"] = {"$gte": tronquer(depuis, granularite)}
+    return [
+        (document["periode"], document["nombre"])
+        for document in db.activite.find(filtre, {"_id": 0, "periode": 1, "nombre": 1}).sort("periode", 1)
+    ]
+
+
+def depuis_jours(jours):
+    """Date de début d'une plage de `jours` jours se terminant aujourd'hui (None : tout)"""
+    if jours is None:
+        return None
+    return tronquer(datetime.now(), "jour") - timedelta(days=jours - 1)
+
+
+def reconstruire_activite(db, metriques=None):
+    """Recalculer les cumuls depuis l'historique, une agrégation par heure et par métrique"""
+    total = 0
+    for metrique in metriques or METRIQUES:
+        definition = METRIQUES[metrique]
+        champ = "$" + definition["date"]
+        cle = {
+            "annee": {"$year": champ}, "mois": {"$month": champ},
+            "jour": {"$dayOfMonth": champ}, "heure": {"$hour": champ},
+        }
+        if definition["par_question"]:
+            cle["question"] = "$id_question"
+
+        # Comptes horaires, puis jours et totaux globaux déduits en Python
+        comptes = Counter()
+        resultats = db[definition["collection"]].aggregate([
+            {"$match": {definition["date"]: {"$type": "date"}}},
+            {"$group": {"_id": cle, "nombre": {"$sum": 1}}}
+        ], allowDiskUse=True)
+        for resultat in resultats:
+            groupe = resultat["_id"]
+            heure = datetime(groupe["annee"], groupe["mois"], groupe["jour"], groupe["heure"])
+            for cle_compteur in _cles(metrique, heure, groupe.get("question")):
+                comptes[cle_compteur] += resultat["nombre"]
+
+        db.activite.delete_many({"metrique": metrique})
+        operations = [
+            UpdateOne(
+                {"metrique": metrique, "id_question": question, "granularite": granularite, "periode": periode},
+                {"$set": {"nombre": nombre}},
+                upsert=True
+            )
+            for (question, granularite, periode), nombre in comptes.items()
+        ]
+        for debut in range(0, len(operations), TAILLE_LOT):
+            db.activite.bulk_write(operations[debut:debut + TAILLE_LOT], ordered=False)
+        total += len(operations)
+    return total
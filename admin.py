@@ -0,0 +1,253 @@
+"""Commandes d'administration de la base : python admin.py <commande>"""
+import argparse
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from bson import ObjectId
+
+from activite import METRIQUES, reconstruire_activite
+from analytics import reconstruire_sentiment_analytics
+from classement import ajuster_tache, enregistrer_classement, preparer_duels
+from audit import SEUIL_TRI, auditer
+from connexion import creer_connexion, lire_configuration
+from intervalles import recalculer_intervalles
+from migrations import appliquer_migrations, version_actuelle
+from paires import attribuer_ordinaux, reconstruire_progression
+from segments import reconstruire_segments
+from sentiment import COLLECTIONS, TAILLE_LOT, rescorer
+from votes import reconstruire_stats_idees
+
+
+def commande_migrer(db, args):
+    """Appliquer les migrations de schéma en attente (une seule exécution à la fois)"""
+    try:
+        appliquees = appliquer_migrations(db)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    for numero, description in appliquees:
+        print(f"  • v{numero} : {description}")
+    print(f"✅ Schéma à jour (version {version_actuelle(db)}, {len(appliquees)} migration(s) appliquée(s))")
+
+
+def commande_reconcilier_sentiment(db, args):
+    """Reconstruire sentiment_analytics à partir des idées et commentaires"""
+    question_ids = [ObjectId(q) for q in args.question] if args.question else None
+    total = reconstruire_sentiment_analytics(db, question_ids)
+    print(f"✅ sentiment_analytics reconstruit pour {total} question(s)")
+
+
+def commande_reconstruire_stats_idees(db, args):
+    """Recalculer victoires/défaites/apparitions des idées depuis les votes"""
+    question_ids = [ObjectId(q) for q in args.question] if args.question else None
+    total = reconstruire_stats_idees(db, question_ids)
+    print(f"✅ Compteurs recalculés pour {total} idée(s)")
+
+
+def commande_reconstruire_progression(db, args):
+    """Renuméroter les idées si demandé puis recalculer les bitsets des paires votées"""
+    question_ids = [ObjectId(q) for q in args.question] if args.question else None
+    if args.ordinaux:
+        print(f"✅ Ordinaux attribués à {attribuer_ordinaux(db, question_ids)} idée(s)")
+    total = reconstruire_progression(db, question_ids)
+    print(f"✅ Progression recalculée pour {total} couple(s) navigateur/question")
+
+
+def commande_rescorer_sentiment(db, args):
+    """Recalculer les scores de sentiment stockés, avec reprise, puis les analytics touchées"""
+    debut = time.perf_counter()
+    lus = defaultdict(int)
+
+    def progression(type_contenu, nombre, modifies):
+        lus[type_contenu] += nombre
+        print(f"  • {type_contenu} : {lus[type_contenu]} document(s) traité(s)", end="\r", flush=True)
+
+    bilan, reconstruites = rescorer(db, args.type or tuple(COLLECTIONS), args.processus,
+                                    args.lot, args.recommencer, progression)
+    print()
+    for type_contenu, (traites, modifies) in bilan.items():
+        print(f"  • {type_contenu} : {traites} traité(s), {modifies} score(s) modifié(s)")
+    duree = time.perf_counter() - debut
+    print(f"✅ Scores recalculés en {duree:.1f} s, sentiment_analytics reconstruit pour {reconstruites} question(s)")
+
+
+def commande_reconstruire_activite(db, args):
+    """Recalculer les cumuls d'activité par jour et par heure depuis l'historique"""
+    debut = time.perf_counter()
+    total = reconstruire_activite(db, args.metrique)
+    print(f"✅ {total} cumul(s) d'activité reconstruit(s) en {time.perf_counter() - debut:.1f} s")
+
+
+def commande_reconstruire_segments(db, args):
+    """Recalculer les victoires et défaites des idées par segment de votants"""
+    question_ids = [ObjectId(q) for q in args.question] if args.question else None
+    debut = time.perf_counter()
+    total = reconstruire_segments(db, question_ids)
+    print(f"✅ {total} compteur(s) par segment reconstruit(s) en {time.perf_counter() - debut:.1f} s")
+
+
+def commande_ajuster_bt(db, args):
+    """Réajuster les scores Bradley-Terry de toutes les questions dans un pool de processus"""
+    debut = time.perf_counter()
+
+    # Un seul passage sur vote pour les duels de toutes les questions
+    duels_par_question = defaultdict(list)
+    duels = db.vote.aggregate([
+        {"$group": {
+            "_id": {
+                "question": "$id_question",
+                "gagnant": "$id_idee_gagnant",
+                "perdant": "$id_idee_perdant"
+            },
+            "nombre": {"$sum": 1}
+        }}
+    ], allowDiskUse=True)
+    for duel in duels:
+        duels_par_question[duel["_id"]["question"]].append(duel)
+
+    precedents = {
+        doc["id_question"]: doc.get("scores")
+        for doc in db.classement_bt.find({}, {"id_question": 1, "scores": 1})
+    }
+
+    taches = []
+    for question_id, duels_question in duels_par_question.items():
+        idee_ids, gagnants, perdants, comptes = preparer_duels(duels_question)
+        taches.append((question_id, idee_ids, gagnants, perdants, comptes,
+                       precedents.get(question_id), int(comptes.sum())))
+
+    with ProcessPoolExecutor(max_workers=args.processus) as pool:
+        for question_id, scores, erreurs, nb_votes in pool.map(ajuster_tache, taches):
+            enregistrer_classement(db, question_id, scores, erreurs, nb_votes)
+
+    duree = time.perf_counter() - debut
+    print(f"✅ Classement Bradley-Terry recalculé pour {len(taches)} question(s) en {duree:.2f} s")
+
+
+def commande_calculer_intervalles(db, args):
+    """Recalculer les intervalles bootstrap des questions ayant reçu de nouveaux votes"""
+    debut = time.perf_counter()
+    total = recalculer_intervalles(db, args.processus)
+    print(f"✅ Intervalles recalculés pour {total} question(s) en {time.perf_counter() - debut:.1f} s")
+
+
+def commande_audit_index(db, args):
+    """Expliquer chaque requête de l'application et échouer sur COLLSCAN ou gros tri en mémoire"""
+    resultats = auditer(lire_configuration(), args.seuil_tri)
+    symboles = {"ok": "✅", "global": "⚠️", "echec": "❌"}
+    for resultat in resultats:
+        print(f"{symboles[resultat['statut']]} {resultat['requete']:<36} "
+              f"{resultat['collection']}.{resultat['commande']:<10} "
+              f"{'+'.join(resultat['etapes']):<40} "
+              f"{resultat['documents_examines']:>9} doc(s) examiné(s)"
+              + (f"  ({resultat['motif']})" if resultat["motif"] else ""))
+
+    echecs = sum(resultat["statut"] == "echec" for resultat in resultats)
+    globales = sum(resultat["statut"] == "global" for resultat in resultats)
+    if echecs:
+        print(f"❌ {echecs} requête(s) sans index adapté sur {len(resultats)}")
+        sys.exit(1)
+    print(f"✅ {len(resultats)} requête(s) auditée(s), {globales} agrégation(s) globale(s) attendue(s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Administration de la base Wiki Survey - Afrique")
+    commandes = parser.add_subparsers(dest="commande", required=True)
+
+    migrer = commandes.add_parser(
+        "migrer",
+        help="Appliquer les migrations de schéma en attente (application arrêtée : certaines reconstruisent "
+             "des compteurs depuis l'historique)"
+    )
+    migrer.set_defaults(fonction=commande_migrer)
+
+    reconcilier = commandes.add_parser(
+        "reconcilier-sentiment",
+        help="Reconstruire sentiment_analytics depuis idees et commentaire (sans analyse de sentiment "
+             "en cours d'écriture dans l'application)"
+    )
+    reconcilier.add_argument("--question", action="append",
+                             help="Identifiant de question à traiter (répétable, défaut : toutes)")
+    reconcilier.set_defaults(fonction=commande_reconcilier_sentiment)
+
+    stats_idees = commandes.add_parser(
+        "reconstruire-stats-idees",
+        help="Recalculer les compteurs victoires/défaites/apparitions des idées"
+    )
+    stats_idees.add_argument("--question", action="append",
+                             help="Identifiant de question à traiter (répétable, défaut : toutes)")
+    stats_idees.set_defaults(fonction=commande_reconstruire_stats_idees)
+
+    progression = commandes.add_parser(
+        "reconstruire-progression",
+        help="Recalculer le nombre d'idées des questions et les bitsets des paires votées depuis la collection vote"
+    )
+    progression.add_argument("--question", action="append",
+                             help="Identifiant de question à traiter (répétable, défaut : toutes)")
+    progression.add_argument("--ordinaux", action="store_true",
+                             help="Renuméroter d'abord les idées (ordre d'insertion)")
+    progression.set_defaults(fonction=commande_reconstruire_progression)
+
+    rescorer_sentiment = commandes.add_parser(
+        "rescorer-sentiment",
+        help="Recalculer les scores de sentiment stockés des idées et commentaires (reprise possible)"
+    )
+    rescorer_sentiment.add_argument("--type", action="append", choices=list(COLLECTIONS),
+                                    help="Type de contenu à traiter (répétable, défaut : tous)")
+    rescorer_sentiment.add_argument("--processus", type=int, default=None,
+                                    help="Nombre de processus (défaut : nombre de cœurs)")
+    rescorer_sentiment.add_argument("--lot", type=int, default=TAILLE_LOT,
+                                    help="Documents lus, analysés et écrits par lot")
+    rescorer_sentiment.add_argument("--recommencer", action="store_true",
+                                    help="Ignorer le point de contrôle et tout reprendre depuis le début")
+    rescorer_sentiment.set_defaults(fonction=commande_rescorer_sentiment)
+
+    activite = commandes.add_parser(
+        "reconstruire-activite",
+        help="Recalculer les cumuls d'activité (votes, questions) par jour et par heure"
+    )
+    activite.add_argument("--metrique", action="append", choices=list(METRIQUES),
+                          help="Métrique à reconstruire (répétable, défaut : toutes)")
+    activite.set_defaults(fonction=commande_reconstruire_activite)
+
+    segments = commandes.add_parser(
+        "reconstruire-segments",
+        help="Recalculer les victoires/défaites des idées par pays, tranche d'âge et genre des votants"
+    )
+    segments.add_argument("--question", action="append",
+                          help="Identifiant de question à traiter (répétable, défaut : toutes)")
+    segments.set_defaults(fonction=commande_reconstruire_segments)
+
+    ajuster_bt = commandes.add_parser(
+        "ajuster-bt",
+        help="Réajuster les scores Bradley-Terry de toutes les questions"
+    )
+    ajuster_bt.add_argument("--processus", type=int, default=None,
+                            help="Nombre de processus (défaut : nombre de cœurs)")
+    ajuster_bt.set_defaults(fonction=commande_ajuster_bt)
+
+    intervalles = commandes.add_parser(
+        "calculer-intervalles",
+        help="Recalculer les intervalles de confiance bootstrap des questions ayant reçu de nouveaux votes"
+    )
+    intervalles.add_argument("--processus", type=int, default=None,
+                             help="Nombre de processus pour les grandes questions (défaut : nombre de cœurs)")
+    intervalles.set_defaults(fonction=commande_calculer_intervalles)
+
+    audit_index = commandes.add_parser(
+        "audit-index",
+        help="Vérifier par explain() que chaque requête de l'application utilise un index"
+    )
+    audit_index.add_argument("--seuil-tri", type=int, default=SEUIL_TRI,
+                             help="Documents triés en mémoire tolérés par requête")
+    audit_index.set_defaults(fonction=commande_audit_index)
+
+    args = parser.parse_args()
+    db = creer_connexion()
+    args.fonction(db, args)
+
+
+if __name__ == "__main__":
+    main()
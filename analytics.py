@@ -0,0 +1,126 @@
+"""Analytics de sentiment pré-agrégées par question (collection sentiment_analytics).
+
+Chaque nouvelle idée ou commentaire applique un $inc sur le document de sa
+question : compteurs par label, nombre d'éléments et somme des scores. Les
+moyennes se déduisent à la lecture (somme / nombre). La reconstruction
+complète n'est utilisée que pour réconcilier les compteurs.
+
+Les deux chemins ne comptent que les éléments déjà notés (sentiment_score
+présent). La reconstruction demande une base au repos : un élément dont le
+score vient d'être écrit en arrière-plan mais pas encore répercuté par
+incrementer_sentiment serait compté deux fois.
+"""
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+# Champ compteur par type de contenu et par label de sentiment
+CHAMPS_LABELS = {
+    "idees": {
+        "Positif": "total_idees_positives",
+        "Négatif": "total_idees_negatives",
+        "Neutre": "total_idees_neutres",
+    },
+    "commentaires": {
+        "Positif": "total_commentaires_positifs",
+        "Négatif": "total_commentaires_negatifs",
+        "Neutre": "total_commentaires_neutres",
+    },
+}
+
+
+def incrementer_sentiment(db, question_id, type_contenu, elements):
+    """Ajouter des éléments (score, label) aux compteurs d'une question en un seul $inc"""
+    champs = CHAMPS_LABELS[type_contenu]
+    increments = {f"nombre_{type_contenu}": 0, f"somme_sentiment_{type_contenu}": 0.0}
+
+    for score, label in elements:
+        increments[f"nombre_{type_contenu}"] += 1
+        increments[f"somme_sentiment_{type_contenu}"] += float(score)
+        if label in champs:
+            increments[champs[label]] = increments.get(champs[label], 0) + 1
+
+    db.sentiment_analytics.update_one(
+        {"id_question": question_id},
+        {
+            "$inc": increments,
+            "$set": {"derniere_mise_a_jour": datetime.now()}
+        },
+        upsert=True
+    )
+
+
+def moyenne_sentiment(analytics, type_contenu):
+    """Score de sentiment moyen d'un type de contenu à partir d'un document d'analytics"""
+    nombre = analytics.get(f"nombre_{type_contenu}", 0)
+    if not nombre:
+        return 0.0
+    return analytics.get(f"somme_sentiment_{type_contenu}", 0.0) / nombre
+
+
+def _document_vide():
+    """Compteurs à zéro pour une question sans idée ni commentaire"""
+    document = {}
+    for type_contenu, champs in CHAMPS_LABELS.items():
+        document[f"nombre_{type_contenu}"] = 0
+        document[f"somme_sentiment_{type_contenu}"] = 0.0
+        for champ in champs.values():
+            document[champ] = 0
+    return document
+
+
+def reconstruire_sentiment_analytics(db, question_ids=None):
+    """Recalculer entièrement les compteurs (toutes les questions ou une liste donnée).
+
+    Sans écriture de sentiment en cours (enregistrer_en_arriere_plan) : voir
+    la docstring du module.
+    """
+    if question_ids is None:
+        question_ids = [q["_id"] for q in db.question.find({}, {"_id": 1})]
+    question_ids = list(question_ids)
+    if not question_ids:
+        return 0
+
+    documents = {question_id: _document_vide() for question_id in question_ids}
+    collections = {"idees": db.idees, "commentaires": db.commentaire}
+
+    # Une agrégation par collection, groupée par question
+    for type_contenu, collection in collections.items():
+        champs = CHAMPS_LABELS[type_contenu]
+        groupe = {
+            "_id": "$id_question",
+            "nombre": {"$sum": 1},
+            "somme": {"$sum": "$sentiment_score"},
+        }
+        for label, champ in champs.items():
+            groupe[champ] = {"$sum": {"$cond": [{"$eq": ["$sentiment_label", label]}, 1, 0]}}
+
+        resultats = collection.aggregate([
+            # Éléments notés seulement, comme incrementer_sentiment
+            {"$match": {"id_question": {"$in": question_ids}, "sentiment_score": {"$type": "number"}}},
+            {"$group": groupe}
+        ])
+        for resultat in resultats:
+            document = documents.get(resultat["_id"])
+            if document is None:
+                continue
+            document[f"nombre_{type_contenu}"] = resultat["nombre"]
+            document[f"somme_sentiment_{type_contenu}"] = float(resultat["somme"])
+            for champ in champs.values():
+                document[champ] = resultat[champ]
+
+    maintenant = datetime.now()
+    operations = [
+        UpdateOne(
+            {"id_question": question_id},
+            {
+                "$set": {**document, "derniere_mise_a_jour": maintenant},
+                # Champs de l'ancien format, désormais calculés à la lecture
+                "$unset": {"moyenne_sentiment_idees": "", "moyenne_sentiment_commentaires": ""}
+            },
+            upsert=True
+        )
+        for question_id, document in documents.items()
+    ]
+    db.sentiment_analytics.bulk_write(operations, ordered=False)
+    return len(operations)
@@ -0,0 +1,168 @@
+"""Audit des index : plan d'exécution de chaque requête de lecture de l'application.
+
+Les requêtes ne sont pas recopiées : chaque fonction de lecture est exécutée
+sur un client dont un écouteur capture les commandes envoyées, puis chaque
+commande capturée est rejouée avec explain (executionStats). Une requête
+échoue si son plan contient un COLLSCAN ou un tri en mémoire (SORT) de plus de
+seuil_tri documents. Les agrégations globales du tableau de bord parcourent
+toute une collection par construction : elles sont signalées sans échouer.
+"""
+from bson import ObjectId
+from pymongo import monitoring
+
+from classement import charger_duels
+from connexion import creer_client
+from paires import charger_idees, charger_paires_votees, compter_paires_restantes_par_question
+from segments import charger_stats_segment, segments_question
+from votes import charger_stats_idees
+
+# Tri en mémoire toléré (documents triés)
+SEUIL_TRI = 1000
+COMMANDES_LECTURE = {"find", "aggregate", "count", "distinct"}
+# Champs propres à la session ou au transport, refusés par explain
+CHAMPS_IGNORES = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "readConcern"}
+
+
+class _Capture(monitoring.CommandListener):
+    """Commandes de lecture émises pendant l'exécution d'une requête"""
+
+    def __init__(self):
+        self.commandes = []
+        self.active = False
+
+    def started(self, event):
+        if self.active and event.command_name in COMMANDES_LECTURE:
+            self.commandes.append({k: v for k, v in event.command.items() if k not in CHAMPS_IGNORES})
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _requetes():
+    """(nom, fonction(db, question_id, id_navigateur), collections parcourues entièrement à dessein)"""
+    # Import local : tableau_de_bord importe streamlit, inutile pour le reste de l'audit
+    import tableau_de_bord
+
+    return [
+        ("login.email", lambda db, q, n: db.login.find_one({"email": "admin@test.com"}), ()),
+        ("profil.navigateur", lambda db, q, n: db.profil.find_one({"id_navigateur": n}), ()),
+        ("question.liste", lambda db, q, n: list(db.question.find(
+            {}, {"_id": 1, "question": 1, "date_creation": 1}).sort("date_creation", -1)), ()),
+        ("question.detail", lambda db, q, n: db.question.find_one({"_id": q}), ()),
+        ("paires.charger_idees", lambda db, q, n: charger_idees(db, q), ()),
+        ("paires.charger_paires_votees", lambda db, q, n: charger_paires_votees(db, q, n), ()),
+        ("paires.restantes_par_question",
+         lambda db, q, n: compter_paires_restantes_par_question(db, n), ("question",)),
+        ("votes.charger_stats_idees", lambda db, q, n: charger_stats_idees(db, q), ()),
+        ("classement.charger_duels", lambda db, q, n: charger_duels(db, q), ()),
+        ("segments.question", lambda db, q, n: segments_question(db, q), ()),
+        ("segments.stats", lambda db, q, n: charger_stats_segment(db, q, "pays", "Sénégal"), ()),
+        ("classement.stocke", lambda db, q, n: db.classement_bt.find_one({"id_question": q}), ()),
+        ("intervalles.stockes", lambda db, q, n: db.intervalles_bt.find_one({"id_question": q}), ()),
+        ("tableau_de_bord.totaux", lambda db, q, n: tableau_de_bord.totaux.calculer(db), ()),
+        ("tableau_de_bord.idees_par_type",
+         lambda db, q, n: tableau_de_bord.idees_par_type.calculer(db), ("idees",)),
+        ("tableau_de_bord.votes_par_periode",
+         lambda db, q, n: tableau_de_bord.votes_par_periode.calculer(db, 7), ()),
+        ("tableau_de_bord.questions_par_periode",
+         lambda db, q, n: tableau_de_bord.questions_par_periode.calculer(db, None), ()),
+        ("tableau_de_bord.sentiment",
+         lambda db, q, n: tableau_de_bord.sentiment.calculer(db), ("idees", "commentaire")),
+        ("tableau_de_bord.pays", lambda db, q, n: tableau_de_bord.pays.calculer(db), ("profil",)),
+        ("tableau_de_bord.ages", lambda db, q, n: tableau_de_bord.ages.calculer(db), ("profil",)),
+    ]
+
+
+def _etapes(plan):
+    """Étapes d'un plan d'exécution (dictionnaires portant « stage »), plans rejetés exclus"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan
+        for cle, valeur in plan.items():
+            if cle not in ("rejectedPlans", "allPlansExecution"):
+                yield from _etapes(valeur)
+    elif isinstance(plan, list):
+        for valeur in plan:
+            yield from _etapes(valeur)
+
+
+def _documents_examines(plan):
+    """Plus grand totalDocsExamined du plan (0 si absent)"""
+    if isinstance(plan, dict):
+        return max([plan.get("totalDocsExamined", 0)] + [_documents_examines(v) for v in plan.values()])
+    if isinstance(plan, list):
+        return max([0] + [_documents_examines(v) for v in plan])
+    return 0
+
+
+def analyser_plan(explain, collections_globales=(), seuil_tri=SEUIL_TRI, collection=None):
+    """Verdict d'un explain : statut (ok / global / echec), étapes, documents examinés et triés"""
+    etapes = list(_etapes(explain))
+    noms = sorted({etape["stage"] for etape in etapes})
+    tri_memoire = max(
+        [etape.get("inputStage", {}).get("nReturned", etape.get("nReturned", 0))
+         for etape in etapes if etape["stage"] == "SORT"] or [0]
+    )
+
+    motifs = []
+    if "COLLSCAN" in noms:
+        motifs.append("COLLSCAN")
+    if tri_memoire > seuil_tri:
+        motifs.append(f"tri en mémoire de {tri_memoire} documents")
+
+    if not motifs:
+        statut = "ok"
+    elif collection in collections_globales and motifs == ["COLLSCAN"]:
+        statut = "global"
+    else:
+        statut = "echec"
+
+    return {
+        "statut": statut,
+        "motif": ", ".join(motifs),
+        "etapes": noms,
+        "documents_examines": _documents_examines(explain),
+        "tri_memoire": tri_memoire,
+    }
+
+
+def auditer(configuration, seuil_tri=SEUIL_TRI, question_id=None, id_navigateur=None):
+    """Exécuter et expliquer chaque requête ; renvoie une ligne par commande émise"""
+    capture = _Capture()
+    client = creer_client(configuration, ecouteurs=[capture])
+    db = client[configuration["MONGO_DB"]]
+
+    try:
+        # Valeurs représentatives : question la plus récente, navigateur ayant voté
+        if question_id is None:
+            question = db.question.find_one({}, {"_id": 1}, sort=[("date_creation", -1)])
+            question_id = question["_id"] if question else ObjectId()
+        if id_navigateur is None:
+            vote = db.vote.find_one({}, {"id_navigateur": 1})
+            id_navigateur = vote["id_navigateur"] if vote else "audit"
+
+        resultats = []
+        for nom, fonction, collections_globales in _requetes():
+            capture.commandes = []
+            capture.active = True
+            try:
+                fonction(db, question_id, id_navigateur)
+            finally:
+                capture.active = False
+
+            for commande in capture.commandes:
+                type_commande = next(iter(commande))
+                collection = commande[type_commande]
+                explain = db.command("explain", commande, verbosity="executionStats")
+                resultats.append({
+                    "requete": nom,
+                    "collection": collection,
+                    "commande": type_commande,
+                    **analyser_plan(explain, collections_globales, seuil_tri, collection),
+                })
+        return resultats
+    finally:
+        client.close()
@@ -0,0 +1 @@
+"""Benchmarks des chemins critiques, à lancer depuis la racine : python -m benchmarks.<module>"""
@@ -0,0 +1,234 @@
+"""Test de charge : N navigateurs simulés votent en parallèle sur un même processus.
+
+Chaque navigateur simulé est un thread, comme une session Streamlit : il
+charge la page de vote (balayage des questions, file de paires) puis enchaîne
+les votes en rejouant le chemin du bouton de vote : écriture du vote (différée
+par défaut, comme l'application), retrait de la paire, paire suivante. Le
+rapport donne le débit, les percentiles de latence et le nombre de commandes
+MongoDB par vote. Le mode rampe enchaîne des paliers de concurrence pour
+trouver le point de saturation.
+
+    python -m benchmarks.charge --navigateurs 20 --duree 30
+    python -m benchmarks.charge --rampe 1,2,4,8,16,32,64 --duree 20 --sortie charge.json
+
+Un mongod est nécessaire : mongomock n'implémente pas $bit (bitsets de progression).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.commun import BASE_BENCHMARK, Chrono, ajouter_arguments_base, refuser_mongomock
+from benchmarks.generateur import id_question, remplir
+from connexion import DEFAUTS, creer_client
+from monitoring import statistiques_pool, suivi_commandes
+from paires import FilePaires, compter_paires_restantes_par_question
+from votes import EcrivainVotes, inserer_vote
+
+# Gain de débit minimal d'un palier au suivant ; en dessous, le palier précédent est saturé
+GAIN_MINIMAL = 0.10
+
+
+class Mesures:
+    """Latences et compteurs d'un palier, partagés par les navigateurs simulés"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.chargements = []
+        self.votes = []
+        self.erreurs = 0
+        self.epuisees = 0
+
+    def ajouter(self, liste, duree):
+        """Ajouter une durée (secondes) à la liste de latences `liste`"""
+        with self._verrou:
+            getattr(self, liste).append(duree * 1000)
+
+    def incrementer(self, compteur):
+        """Incrémenter un compteur d'événements"""
+        with self._verrou:
+            setattr(self, compteur, getattr(self, compteur) + 1)
+
+
+def percentiles(durees):
+    """p50/p95/p99 et max en millisecondes"""
+    if not durees:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(durees, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2), "max_ms": round(float(np.max(durees)), 2)}
+
+
+def navigateur_simule(db, numero, questions, ecrire_vote, executeur, fin, reflexion, mesures):
+    """Charger la page de vote puis voter jusqu'à la fin du palier"""
+    rng = random.Random(numero)
+    id_navigateur = f"charge-{numero:06d}-{time.time_ns()}"
+
+    try:
+        with Chrono() as chrono:
+            compter_paires_restantes_par_question(db, id_navigateur)
+            file = FilePaires(db, rng.choice(questions), id_navigateur, executeur, rng=rng)
+            entree = file.tete()
+        mesures.ajouter("chargements", chrono.duree)
+
+        while time.monotonic() < fin:
+            if entree is None:
+                # Toutes les paires votées : passer à une autre question
+                mesures.incrementer("epuisees")
+                file = FilePaires(db, rng.choice(questions), id_navigateur, executeur, rng=rng)
+                entree = file.tete()
+                if entree is None:
+                    return
+            if reflexion:
+                time.sleep(rng.expovariate(1 / reflexion))
+
+            with Chrono() as chrono:
+                gagnant, perdant = entree["ids"] if rng.random() < 0.5 else entree["ids"][::-1]
+                ecrire_vote(id_navigateur, file.question_id, gagnant, perdant)
+                file.voter(gagnant, perdant)
+                entree = file.tete()
+            mesures.ajouter("votes", chrono.duree)
+    except Exception as e:
+        mesures.incrementer("erreurs")
+        print(f"❌ Navigateur {numero} : {e}")
+
+
+def palier(db, nb_navigateurs, questions, args):
+    """Faire tourner nb_navigateurs navigateurs simulés pendant args.duree secondes"""
+    mesures = Mesures()
+    commandes_avant = suivi_commandes.totaux()
+    pool_avant = statistiques_pool.statistiques()
+
+    ecrivain = EcrivainVotes(db) if args.ecriture == "differee" else None
+    if ecrivain:
+        ecrire_vote = ecrivain.soumettre
+    else:
+        def ecrire_vote(id_navigateur, question_id, gagnant, perdant):
+            inserer_vote(db, id_navigateur, question_id, gagnant, perdant)
+
+    with ThreadPoolExecutor(max_workers=8, thread_name_prefix="recharge") as executeur:
+        debut = time.monotonic()
+        fin = debut + args.duree
+        threads = [
+            threading.Thread(target=navigateur_simule, daemon=True, args=(
+                db, numero, questions, ecrire_vote, executeur, fin, args.reflexion, mesures))
+            for numero in range(nb_navigateurs)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duree = time.monotonic() - debut
+
+    # Votes encore en file : temps nécessaire pour tout écrire
+    with Chrono() as vidage:
+        if ecrivain:
+            ecrivain.arreter(delai=600)
+    ecrits = ecrivain.statistiques()["ecrits"] if ecrivain else len(mesures.votes)
+
+    commandes = suivi_commandes.totaux()
+    commandes.subtract(commandes_avant)
+    nb_commandes = sum(commandes.values())
+    pool = statistiques_pool.statistiques()
+    nb_votes = len(mesures.votes)
+
+    return {
+        "navigateurs": nb_navigateurs,
+        "duree_s": round(duree, 2),
+        "votes": nb_votes,
+        "votes_par_s": round(nb_votes / duree, 1),
+        "votes_ecrits_par_s": round(ecrits / (duree + vidage.duree), 1),
+        "vidage_s": round(vidage.duree, 2),
+        "latence_vote": percentiles(mesures.votes),
+        "latence_chargement": percentiles(mesures.chargements),
+        "erreurs": mesures.erreurs,
+        "questions_epuisees": mesures.epuisees,
+        "commandes": nb_commandes,
+        "commandes_par_vote": round(nb_commandes / nb_votes, 2) if nb_votes else None,
+        "commandes_detail": {f"{collection}.{commande}": nombre
+                             for (collection, commande), nombre in commandes.most_common() if nombre},
+        "attente_pool_max_ms": round(pool["attente_max_ms"], 2),
+        "emprunts_echoues": pool["emprunts_echoues"] - pool_avant["emprunts_echoues"],
+    }
+
+
+def point_de_saturation(paliers, p95_max):
+    """Dernier palier avant que le débit cesse de croître ou que le p95 dépasse p95_max"""
+    sature = None
+    for precedent, palier_suivant in zip(paliers, paliers[1:]):
+        gain = palier_suivant["votes_par_s"] / precedent["votes_par_s"] - 1 if precedent["votes_par_s"] else 0
+        p95 = palier_suivant["latence_vote"]["p95_ms"]
+        if gain < GAIN_MINIMAL or (p95_max and p95 is not None and p95 > p95_max):
+            sature = precedent["navigateurs"]
+            break
+    return sature
+
+
+def afficher(resultat):
+    """Une ligne par palier"""
+    latence = resultat["latence_vote"]
+    print(f"✅ {resultat['navigateurs']:>4} navigateurs : {resultat['votes_par_s']:8.1f} votes/s  "
+          f"p50 {latence['p50_ms'] or 0:7.2f} ms  p95 {latence['p95_ms'] or 0:7.2f} ms  "
+          f"p99 {latence['p99_ms'] or 0:7.2f} ms  "
+          f"{resultat['commandes_par_vote'] or 0:5.2f} commandes/vote  "
+          f"écriture {resultat['votes_ecrits_par_s']:8.1f} votes/s"
+          + (f"  ❌ {resultat['erreurs']} erreur(s)" if resultat["erreurs"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ajouter_arguments_base(parser)
+    parser.add_argument("--navigateurs", type=int, default=10, help="Navigateurs simulés simultanés")
+    parser.add_argument("--rampe", help="Paliers de concurrence séparés par des virgules (ex. 1,2,4,8,16)")
+    parser.add_argument("--duree", type=float, default=20, help="Durée de chaque palier (secondes)")
+    parser.add_argument("--reflexion", type=float, default=0,
+                        help="Temps de réflexion moyen entre deux votes (secondes, 0 = aucun)")
+    parser.add_argument("--ecriture", choices=["differee", "directe"], default="differee",
+                        help="Écriture des votes : file différée de l'application ou insertion directe")
+    parser.add_argument("--p95-max", type=float, default=None,
+                        help="Latence p95 (ms) au-delà de laquelle un palier est considéré saturé")
+    parser.add_argument("--pool", type=int, default=DEFAUTS["MONGO_POOL_MAX"], help="Taille max du pool")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--idees", type=int, default=50, help="Idées par question")
+    parser.add_argument("--votes", type=int, default=10000, help="Votes déjà présents avant la charge")
+    parser.add_argument("--sortie", help="Fichier du rapport JSON")
+    args = parser.parse_args()
+    refuser_mongomock(parser, args)
+
+    configuration = dict(DEFAUTS, MONGO_URI=args.uri, MONGO_POOL_MAX=args.pool)
+    db = creer_client(configuration)[BASE_BENCHMARK]
+
+    remplir(db, args.questions, args.idees, nb_votes=args.votes)
+    questions = [id_question(q) for q in range(args.questions)]
+    niveaux = [int(n) for n in args.rampe.split(",")] if args.rampe else [args.navigateurs]
+
+    paliers = []
+    try:
+        for niveau in niveaux:
+            resultat = palier(db, niveau, questions, args)
+            afficher(resultat)
+            paliers.append(resultat)
+    finally:
+        db.client.drop_database(db.name)
+
+    rapport = {"parametres": vars(args), "paliers": paliers}
+    if len(paliers) > 1:
+        sature = point_de_saturation(paliers, args.p95_max)
+        rapport["saturation"] = sature
+        if sature:
+            print(f"❌ Saturation au-delà de {sature} navigateurs simultanés")
+        else:
+            print("✅ Pas de saturation observée sur ces paliers")
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+        print(f"✅ Rapport écrit dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Durée des chemins critiques de l'application à plusieurs tailles de base.
+
+Pour chaque nombre de votes demandé, la base de benchmark est régénérée
+(générateur déterministe) puis chaque chemin est mesuré plusieurs fois :
+tirage de paire, balayage des questions de « Participer », pipeline des
+résultats, analytics de sentiment et chaque jeu du tableau de bord. Le rapport
+JSON peut être comparé à celui d'un autre commit avec --comparer.
+
+    python -m benchmarks.chemins_critiques --mongomock --tailles 1000,10000
+    python -m benchmarks.chemins_critiques --tailles 10000,100000,1000000 \\
+        --sortie apres.json --comparer avant.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pymongo
+
+import tableau_de_bord
+from analytics import incrementer_sentiment, reconstruire_sentiment_analytics
+from benchmarks.commun import Chrono, ajouter_arguments_base, ouvrir_base
+from benchmarks.generateur import id_navigateur, id_question, remplir
+from classement import ajuster_question, charger_duels, classement_question, preparer_duels
+from paires import (FilePaires, charger_idees, charger_paires_votees,
+                    compter_paires_restantes_par_question, tirer_paire)
+from votes import charger_stats_idees
+
+# Ralentissement (rapport nouveau / ancien de la médiane) signalé comme régression
+SEUIL_REGRESSION = 1.25
+
+
+def chemins(db, executeur):
+    """Chemins mesurés : nom -> fonction sans argument"""
+    question_id = id_question(0)
+    navigateur = id_navigateur(0)
+    rng = random.Random(0)
+
+    def tirage_paire():
+        idees = charger_idees(db, question_id)
+        paires_votees = charger_paires_votees(db, question_id, navigateur)
+        return tirer_paire(len(idees), paires_votees, rng)
+
+    def ajustement_bt():
+        return ajuster_question(*preparer_duels(charger_duels(db, question_id)))
+
+    nb_votes = db.vote.count_documents({"id_question": question_id})
+    classement_question(db, question_id, nb_votes)
+
+    mesures = {
+        "paires.tirage": tirage_paire,
+        "paires.file": lambda: FilePaires(db, question_id, navigateur, executeur, rng=rng),
+        "participer.restantes_par_question": lambda: compter_paires_restantes_par_question(db, navigateur),
+        "resultats.stats_idees": lambda: charger_stats_idees(db, question_id),
+        "resultats.ajustement_bt": ajustement_bt,
+        "resultats.classement_stocke": lambda: classement_question(db, question_id, nb_votes),
+        "analytics.incrementer_sentiment": lambda: incrementer_sentiment(
+            db, question_id, "idees", [(0.5, "Positif")]),
+        "analytics.reconstruire": lambda: reconstruire_sentiment_analytics(db, [question_id]),
+    }
+    # Jeux du tableau de bord et arguments passés par l'application
+    jeux = {
+        "totaux": (),
+        "votes_par_periode": (30,),
+        "questions_par_periode": (None,),
+        "idees_par_type": (),
+        "sentiment": (),
+        "pays": (),
+        "ages": (),
+        "duels": (str(question_id), nb_votes),
+    }
+    for jeu, arguments in jeux.items():
+        mesures[f"tableau_de_bord.{jeu}"] = (
+            lambda jeu=jeu, arguments=arguments: getattr(tableau_de_bord, jeu).calculer(db, *arguments))
+    return mesures
+
+
+def mesurer(fonction, repetitions):
+    """Durées en millisecondes (médiane, min, max) après un appel de chauffe"""
+    fonction()
+    durees = []
+    for _ in range(repetitions):
+        with Chrono() as chrono:
+            fonction()
+        durees.append(chrono.duree * 1000)
+    return {
+        "mediane_ms": round(statistics.median(durees), 3),
+        "min_ms": round(min(durees), 3),
+        "max_ms": round(max(durees), 3),
+        "repetitions": repetitions,
+    }
+
+
+def environnement():
+    """Commit et versions, pour savoir ce que compare un rapport"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pymongo": pymongo.version,
+        "machine": platform.machine(),
+    }
+
+
+def comparer(ancien, nouveau, seuil=SEUIL_REGRESSION):
+    """Afficher les rapports de médianes ; renvoie le nombre de régressions"""
+    anciens = {
+        (resultat["parametres"]["votes"], nom): mesure["mediane_ms"]
+        for resultat in ancien["resultats"]
+        for nom, mesure in resultat["mesures"].items()
+    }
+    regressions = 0
+    for resultat in nouveau["resultats"]:
+        taille = resultat["parametres"]["votes"]
+        for nom, mesure in resultat["mesures"].items():
+            avant = anciens.get((taille, nom))
+            if not avant:
+                continue
+            rapport = mesure["mediane_ms"] / avant
+            regression = rapport > seuil
+            regressions += regression
+            print(f"{'❌' if regression else '✅'} {taille:>9} votes  {nom:<40} "
+                  f"{avant:10.2f} ms -> {mesure['mediane_ms']:10.2f} ms  (x{rapport:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ajouter_arguments_base(parser)
+    parser.add_argument("--tailles", default="1000,10000,100000",
+                        help="Nombres de votes à générer, séparés par des virgules")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--idees", type=int, default=50, help="Idées par question")
+    parser.add_argument("--navigateurs", type=int, default=1000)
+    parser.add_argument("--commentaires", type=int, default=20, help="Commentaires par question")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--sortie", default="rapport_benchmark.json", help="Fichier du rapport JSON")
+    parser.add_argument("--comparer", help="Rapport JSON de référence (commit précédent)")
+    parser.add_argument("--seuil", type=float, default=SEUIL_REGRESSION,
+                        help="Rapport de médianes au-delà duquel une mesure est une régression")
+    args = parser.parse_args()
+
+    db = ouvrir_base(args.uri, args.mongomock)
+    rapport = {"environnement": environnement(), "resultats": []}
+
+    with ThreadPoolExecutor(max_workers=1) as executeur:
+        for taille in (int(t) for t in args.tailles.split(",")):
+            with Chrono() as chrono:
+                parametres = remplir(db, args.questions, args.idees, args.navigateurs,
+                                     taille, args.commentaires, args.graine)
+            print(f"✅ Base générée : {taille} votes en {chrono.duree:.1f} s")
+
+            mesures = {}
+            for nom, fonction in chemins(db, executeur).items():
+                mesures[nom] = mesurer(fonction, args.repetitions)
+                print(f"   {nom:<40} {mesures[nom]['mediane_ms']:10.2f} ms")
+            rapport["resultats"].append({"parametres": parametres, "mesures": mesures})
+
+    db.client.drop_database(db.name)
+
+    with open(args.sortie, "w", encoding="utf-8") as fichier:
+        json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+    print(f"✅ Rapport écrit dans {args.sortie}")
+
+    if args.comparer:
+        with open(args.comparer, encoding="utf-8") as fichier:
+            regressions = comparer(json.load(fichier), rapport, args.seuil)
+        if regressions:
+            print(f"❌ {regressions} régression(s) au-delà de x{args.seuil}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Outils partagés par les benchmarks : base de test et mesure des durées."""
+import time
+
+# Base dédiée, jamais la base de production
+BASE_BENCHMARK = "bench_wiki_survey"
+
+
+def ouvrir_base(uri=None, mongomock=False, nom=BASE_BENCHMARK):
+    """Base de benchmark sur un mongod local (uri) ou en mémoire (mongomock)"""
+    if mongomock:
+        import mongomock as module_mongomock
+        return module_mongomock.MongoClient()[nom]
+
+    from pymongo import MongoClient
+    return MongoClient(uri or "mongodb://localhost:27017")[nom]
+
+
+def ajouter_arguments_base(parser):
+    """Options communes de sélection de la base"""
+    parser.add_argument("--uri", default="mongodb://localhost:27017",
+                        help="URI du mongod de test (jamais la production)")
+    parser.add_argument("--mongomock", action="store_true",
+                        help="Utiliser une base en mémoire (mongomock) au lieu d'un mongod")
+
+
+def refuser_mongomock(parser, args):
+    """Arrêter un benchmark qui écrit des votes : mongomock n'implémente pas $bit (bitsets de progression)"""
+    if args.mongomock:
+        parser.error("--mongomock n'est pas pris en charge : l'écriture des votes met à jour les bitsets "
+                     "de progression avec $bit, que mongomock n'implémente pas. Utiliser --uri vers un mongod de test.")
+
+
+class Chrono:
+    """Mesurer la durée d'un bloc : with Chrono() as c: ... puis c.duree"""
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duree = time.perf_counter() - self.debut
+        return False
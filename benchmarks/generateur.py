@@ -0,0 +1,180 @@
+"""Générateur déterministe de données synthétiques pour les benchmarks.
+
+La même graine produit les mêmes identifiants, textes, profils et votes : deux
+exécutions (ou deux commits) mesurent exactement la même base. Les votes sont
+tirés d'un modèle de Bradley-Terry (une force latente par idée) et écrits par
+lots ; les compteurs des idées, les analytics de sentiment, les bitsets de
+progression, les cumuls d'activité et les compteurs par segment sont remplis
+comme en production.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+
+from activite import reconstruire_activite
+from analytics import reconstruire_sentiment_analytics
+from migrations import appliquer_migrations
+from paires import reconstruire_progression
+from segments import reconstruire_segments
+from sentiment import label_sentiment
+from votes import TAILLE_LOT
+
+PAYS = ["Sénégal", "Côte d'Ivoire", "Mali", "Cameroun", "Bénin", "Togo",
+        "Burkina Faso", "Niger", "Guinée", "Maroc", "Tunisie", "RDC"]
+SEXES = ["Homme", "Femme", "Autre"]
+# Part des navigateurs ayant rempli leur profil
+PART_PROFILS = 0.3
+# Étalement des dates (jours avant maintenant)
+JOURS_HISTORIQUE = 365
+
+
+def _identifiant(prefixe, numero):
+    """ObjectId déterministe ; le tri par _id suit l'ordre de génération"""
+    return ObjectId(f"{prefixe:08x}{numero:016x}")
+
+
+def id_question(numero):
+    """Identifiant de la question numéro `numero`"""
+    return _identifiant(1, numero)
+
+
+def id_idee(question, numero):
+    """Identifiant de l'idée `numero` de la question `question`"""
+    return _identifiant(2, question << 24 | numero)
+
+
+def id_navigateur(numero):
+    """Identifiant du navigateur simulé `numero`"""
+    return f"bench-{numero:07d}"
+
+
+def _date(maintenant, jours):
+    """Date située `jours` jours avant maintenant"""
+    return maintenant - timedelta(days=float(jours))
+
+
+def remplir(db, nb_questions=10, idees_par_question=50, nb_navigateurs=1000,
+            nb_votes=10000, commentaires_par_question=20, graine=0):
+    """Vider la base puis la remplir ; renvoie les paramètres de génération"""
+    rng = np.random.default_rng(graine)
+    maintenant = datetime.now().replace(microsecond=0)
+
+    db.client.drop_database(db.name)
+    appliquer_migrations(db)
+
+    # Questions
+    db.question.insert_many([
+        {
+            "_id": id_question(q),
+            "question": f"Question de benchmark {q}",
+            "createur_id": None,
+            "createur_email": "bench@test.com",
+            "nb_idees": idees_par_question,
+            "date_creation": _date(maintenant, rng.uniform(0, JOURS_HISTORIQUE))
+        }
+        for q in range(nb_questions)
+    ])
+
+    # Navigateurs et profils
+    for debut in range(0, nb_navigateurs, TAILLE_LOT):
+        numeros = range(debut, min(debut + TAILLE_LOT, nb_navigateurs))
+        db.navigateur.insert_many([
+            {
+                "id_navigateur": id_navigateur(b),
+                "navigateur": "Bench",
+                "date_creation": _date(maintenant, rng.uniform(0, JOURS_HISTORIQUE))
+            }
+            for b in numeros
+        ])
+        profils = [
+            {
+                "id_navigateur": id_navigateur(b),
+                "pays": PAYS[rng.integers(len(PAYS))],
+                "age": int(rng.integers(15, 85)),
+                "sexe": SEXES[rng.integers(len(SEXES))],
+                "fonction": None,
+                "date_creation": _date(maintenant, rng.uniform(0, JOURS_HISTORIQUE))
+            }
+            for b in numeros if rng.random() < PART_PROFILS
+        ]
+        if profils:
+            db.profil.insert_many(profils)
+
+    # Votes : paire uniforme, issue tirée des forces latentes
+    forces = rng.normal(0, 1, size=(nb_questions, idees_par_question))
+    victoires = np.zeros((nb_questions, idees_par_question), dtype=np.int64)
+    defaites = np.zeros((nb_questions, idees_par_question), dtype=np.int64)
+
+    for debut in range(0, nb_votes, TAILLE_LOT):
+        taille = min(TAILLE_LOT, nb_votes - debut)
+        questions = rng.integers(nb_questions, size=taille)
+        a = rng.integers(idees_par_question, size=taille)
+        b = (a + rng.integers(1, idees_par_question, size=taille)) % idees_par_question
+        proba_a = 1 / (1 + np.exp(forces[questions, b] - forces[questions, a]))
+        a_gagne = rng.random(taille) < proba_a
+        gagnants = np.where(a_gagne, a, b)
+        perdants = np.where(a_gagne, b, a)
+        navigateurs = rng.integers(nb_navigateurs, size=taille)
+        jours = rng.uniform(0, JOURS_HISTORIQUE, size=taille)
+
+        np.add.at(victoires, (questions, gagnants), 1)
+        np.add.at(defaites, (questions, perdants), 1)
+        db.vote.insert_many([
+            {
+                "id_navigateur": id_navigateur(int(nav)),
+                "id_question": id_question(int(q)),
+                "id_idee_gagnant": id_idee(int(q), int(g)),
+                "id_idee_perdant": id_idee(int(q), int(p)),
+                "date_vote": _date(maintenant, jour)
+            }
+            for q, g, p, nav, jour in zip(questions, gagnants, perdants, navigateurs, jours)
+        ], ordered=False)
+
+    # Idées, avec leurs compteurs déjà à jour
+    for q in range(nb_questions):
+        scores = rng.uniform(-1, 1, size=idees_par_question)
+        db.idees.insert_many([
+            {
+                "_id": id_idee(q, i),
+                "id_question": id_question(q),
+                "idee_texte": f"Idée {i} de la question {q}",
+                "creer_par_utilisateur": "oui" if i >= 2 and rng.random() < 0.5 else "non",
+                "ordinal": i,
+                "date_creation": _date(maintenant, rng.uniform(0, JOURS_HISTORIQUE)),
+                "sentiment_score": float(scores[i]),
+                "sentiment_label": label_sentiment(scores[i]),
+                "victoires": int(victoires[q, i]),
+                "defaites": int(defaites[q, i]),
+                "apparitions": int(victoires[q, i] + defaites[q, i])
+            }
+            for i in range(idees_par_question)
+        ])
+
+        scores = rng.uniform(-1, 1, size=commentaires_par_question)
+        if commentaires_par_question:
+            db.commentaire.insert_many([
+                {
+                    "id_navigateur": id_navigateur(int(rng.integers(nb_navigateurs))),
+                    "id_question": id_question(q),
+                    "commentaire": f"Commentaire {c} de la question {q}",
+                    "date_creation": _date(maintenant, rng.uniform(0, JOURS_HISTORIQUE)),
+                    "sentiment_score": float(scores[c]),
+                    "sentiment_label": label_sentiment(scores[c])
+                }
+                for c in range(commentaires_par_question)
+            ])
+
+    reconstruire_sentiment_analytics(db)
+    reconstruire_progression(db)
+    reconstruire_activite(db)
+    reconstruire_segments(db)
+
+    return {
+        "questions": nb_questions,
+        "idees_par_question": idees_par_question,
+        "navigateurs": nb_navigateurs,
+        "votes": nb_votes,
+        "commentaires_par_question": commentaires_par_question,
+        "graine": graine,
+    }
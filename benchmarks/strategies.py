@@ -0,0 +1,132 @@
+"""Votes nécessaires à chaque stratégie de paires pour retrouver le vrai classement.
+
+Simulation hors base : chaque idée a une force latente, les votants simulés
+reçoivent les paires choisies par la stratégie (sans revoter une paire) et
+votent selon le modèle de Bradley-Terry. Une part des idées arrive en cours de
+route, comme les idées proposées par les participants. Tous les `pas` votes,
+les scores sont réajustés (et transmis à la stratégie) puis comparés aux forces
+latentes par corrélation de rangs de Spearman.
+
+    python -m benchmarks.strategies --idees 60 --cible 0.95 --repetitions 5
+"""
+import argparse
+import json
+import random
+import statistics
+
+import numpy as np
+
+from classement import ajuster_bradley_terry
+from paires import STRATEGIES, EnsemblePaires, etat_idees, paire_depuis_indice
+
+
+def correlation_rangs(a, b):
+    """Corrélation de Spearman (rangs sans ex aequo)"""
+    rangs_a = np.argsort(np.argsort(a))
+    rangs_b = np.argsort(np.argsort(b))
+    return float(np.corrcoef(rangs_a, rangs_b)[0, 1])
+
+
+def simuler(strategie, nb_idees, nb_votants, max_votes, pas, part_tardives, graine):
+    """Courbe (votes, corrélation) d'une stratégie sur une question simulée"""
+    rng = random.Random(graine)
+    forces = np.random.default_rng(graine).normal(0, 1, size=nb_idees)
+    choisir = STRATEGIES[strategie]
+
+    # Les idées tardives (derniers ordinaux) arrivent au quart du budget de votes
+    nb_initiales = nb_idees - int(nb_idees * part_tardives)
+    arrivee = max_votes // 4
+    n = nb_initiales
+
+    etat = etat_idees(nb_idees)
+    votees = [EnsemblePaires() for _ in range(nb_votants)]
+    gagnants, perdants = [], []
+    theta = np.zeros(nb_idees)
+    courbe = []
+
+    for vote in range(1, max_votes + 1):
+        if vote == arrivee:
+            n = nb_idees
+
+        votant = rng.randrange(nb_votants)
+        k = choisir(n, votees[votant], rng, etat)
+        if k is None:
+            continue
+        votees[votant].add(k)
+        i, j = paire_depuis_indice(k)
+        etat["apparitions"][i] += 1
+        etat["apparitions"][j] += 1
+        if rng.random() < 1 / (1 + np.exp(forces[j] - forces[i])):
+            gagnants.append(i)
+            perdants.append(j)
+        else:
+            gagnants.append(j)
+            perdants.append(i)
+
+        if vote % pas == 0:
+            theta, erreurs = ajuster_bradley_terry(
+                nb_idees, np.array(gagnants), np.array(perdants), np.ones(len(gagnants)), init=theta
+            )
+            etat["scores"] = theta.tolist()
+            etat["erreurs"] = erreurs.tolist()
+            courbe.append((vote, correlation_rangs(theta, forces)))
+
+    return courbe
+
+
+def votes_pour_cible(courbe, cible):
+    """Premier nombre de votes à partir duquel la corrélation reste au-dessus de la cible"""
+    atteint = None
+    for votes, correlation in courbe:
+        if correlation >= cible:
+            atteint = atteint or votes
+        else:
+            atteint = None
+    return atteint
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--strategies", default=",".join(STRATEGIES),
+                        help="Stratégies à comparer, séparées par des virgules")
+    parser.add_argument("--idees", type=int, default=60)
+    parser.add_argument("--votants", type=int, default=200)
+    parser.add_argument("--max-votes", type=int, default=12000)
+    parser.add_argument("--pas", type=int, default=200, help="Votes entre deux réajustements")
+    parser.add_argument("--tardives", type=float, default=0.2,
+                        help="Part des idées arrivant au quart du budget de votes")
+    parser.add_argument("--cible", type=float, default=0.95, help="Corrélation de rangs visée")
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--sortie", help="Fichier du rapport JSON")
+    args = parser.parse_args()
+
+    rapport = {"parametres": vars(args), "strategies": {}}
+    for strategie in args.strategies.split(","):
+        besoins = []
+        finales = []
+        for graine in range(args.repetitions):
+            courbe = simuler(strategie, args.idees, args.votants, args.max_votes,
+                             args.pas, args.tardives, graine)
+            besoins.append(votes_pour_cible(courbe, args.cible))
+            finales.append(courbe[-1][1] if courbe else None)
+
+        atteints = [b for b in besoins if b is not None]
+        mediane = statistics.median(atteints) if len(atteints) == len(besoins) else None
+        rapport["strategies"][strategie] = {
+            "votes_pour_cible": besoins,
+            "mediane": mediane,
+            "correlation_finale": round(statistics.mean(finales), 4),
+        }
+        print(f"{'✅' if mediane else '❌'} {strategie:<12} "
+              f"{('%d votes' % mediane) if mediane else 'cible non atteinte':>18} (médiane)  "
+              f"corrélation finale {statistics.mean(finales):.3f}  "
+              f"cible atteinte {len(atteints)}/{len(besoins)}")
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as fichier:
+            json.dump(rapport, fichier, indent=2, ensure_ascii=False)
+        print(f"✅ Rapport écrit dans {args.sortie}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Votes par minute d'un participant, avec et sans l'attente après chaque vote.
+
+Chaque vote rejoue le chemin du gestionnaire de vote puis du rerun : écriture
+du vote, rechargement des idées et des paires votées, tirage de la paire
+suivante. Le scénario « avant » est une simulation : le même chemin actuel,
+plus le time.sleep(0.5) que les boutons de vote faisaient avant st.rerun().
+L'écart mesure donc le coût de cette attente, pas celui de l'ancien
+gestionnaire.
+
+    python -m benchmarks.votes_par_minute --uri mongodb://localhost:27017
+
+Un mongod est nécessaire : mongomock n'implémente pas $bit (bitsets de progression).
+"""
+import argparse
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+
+from activite import GRANULARITES, tronquer
+from benchmarks.commun import Chrono, ajouter_arguments_base, ouvrir_base, refuser_mongomock
+from paires import charger_idees, charger_paires_votees, paire_depuis_indice, tirer_paire
+from votes import inserer_vote
+
+# Attente ajoutée par l'ancien gestionnaire de vote
+ATTENTE_AVANT = 0.5
+
+
+def creer_question(db, nb_idees):
+    """Question de test avec nb_idees idées"""
+    question_id = db.question.insert_one({
+        "question": "Question de benchmark",
+        "date_creation": datetime.now(),
+        "nb_idees": nb_idees
+    }).inserted_id
+    db.idees.insert_many([
+        {
+            "id_question": question_id,
+            "idee_texte": f"Idée {i}",
+            "creer_par_utilisateur": "non",
+            "ordinal": i,
+            "victoires": 0, "defaites": 0, "apparitions": 0
+        }
+        for i in range(nb_idees)
+    ])
+    return question_id
+
+
+def session_de_vote(db, question_id, nb_votes, attente, rng):
+    """Enchaîner nb_votes votes et renvoyer le nombre de votes par minute"""
+    id_navigateur = str(uuid.uuid4())
+    with Chrono() as chrono:
+        for _ in range(nb_votes):
+            idees = charger_idees(db, question_id)
+            paires_votees = charger_paires_votees(db, question_id, id_navigateur)
+            k = tirer_paire(len(idees), paires_votees, rng)
+            if k is None:
+                break
+            i, j = paire_depuis_indice(k)
+            inserer_vote(db, id_navigateur, question_id, idees[i]["_id"], idees[j]["_id"])
+            if attente:
+                time.sleep(attente)
+    return nb_votes / chrono.duree * 60
+
+
+def nettoyer(db, question_id):
+    """Supprimer la question de test, ses votes et leurs traces (progression, cumuls d'activité)"""
+    # Votes de test retirés des cumuls globaux, puis lignes propres à la question supprimées
+    deltas = Counter(
+        (granularite, tronquer(vote["date_vote"], granularite))
+        for vote in db.vote.find({"id_question": question_id}, {"date_vote": 1})
+        for granularite in GRANULARITES
+    )
+    for (granularite, periode), nombre in deltas.items():
+        db.activite.update_one(
+            {"metrique": "votes", "id_question": None, "granularite": granularite, "periode": periode},
+            {"$inc": {"nombre": -nombre}}
+        )
+    db.activite.delete_many({"metrique": "votes", "id_question": None, "nombre": {"$lte": 0}})
+    db.activite.delete_many({"id_question": question_id})
+
+    db.vote.delete_many({"id_question": question_id})
+    db.progression.delete_many({"id_question": question_id})
+    db.idees.delete_many({"id_question": question_id})
+    db.question.delete_one({"_id": question_id})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ajouter_arguments_base(parser)
+    parser.add_argument("--idees", type=int, default=30, help="Idées dans la question de test")
+    parser.add_argument("--votes", type=int, default=20, help="Votes par scénario")
+    args = parser.parse_args()
+    refuser_mongomock(parser, args)
+
+    db = ouvrir_base(args.uri)
+    rng = random.Random(0)
+    question_id = creer_question(db, args.idees)
+    try:
+        avant = session_de_vote(db, question_id, args.votes, ATTENTE_AVANT, rng)
+        apres = session_de_vote(db, question_id, args.votes, 0, rng)
+    finally:
+        nettoyer(db, question_id)
+
+    print(f"Avant (simulé : chemin actuel + attente de {ATTENTE_AVANT} s) : {avant:8.1f} votes/min")
+    print(f"Après (retour immédiat)                         : {apres:8.1f} votes/min")
+    print(f"Gain                                            : x{apres / avant:.1f}")
+    print("ℹ️ Simulation : le gain mesure le coût de l'attente supprimée, pas l'ancien gestionnaire de vote.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Classement des idées par le modèle de Bradley-Terry.
+
+Chaque idée i a une force p_i = exp(theta_i) et gagne contre j avec la
+probabilité p_i / (p_i + p_j). L'ajustement utilise l'itération de point fixe
+de Newman (2023), variante de l'algorithme MM de Hunter (2004) qui converge en
+quelques dizaines d'itérations, sur la liste des duels (gagnant, perdant,
+nombre), ce qui correspond à une matrice de victoires creuse. Les scores sont centrés (force
+moyenne 1) et chaque idée reçoit PRIOR victoires et défaites fictives contre
+une idée moyenne, ce qui garde des scores finis pour les idées qui n'ont
+jamais gagné ou jamais perdu.
+"""
+from datetime import datetime
+
+import numpy as np
+
+# Victoires et défaites fictives contre une idée moyenne
+PRIOR = 0.5
+TOLERANCE = 1e-7
+MAX_ITERATIONS = 1000
+# Au-delà, les erreurs types utilisent l'approximation diagonale de l'information de Fisher
+LIMITE_INVERSION = 500
+
+
+def charger_duels(db, question_id):
+    """Nombre de victoires de chaque idée sur chaque autre, en une agrégation"""
+    return list(db.vote.aggregate([
+        {"$match": {"id_question": question_id}},
+        {"$group": {
+            "_id": {"gagnant": "$id_idee_gagnant", "perdant": "$id_idee_perdant"},
+            "nombre": {"$sum": 1}
+        }}
+    ]))
+
+
+def preparer_duels(duels):
+    """Identifiants des idées et tableaux NumPy (gagnants, perdants, comptes)"""
+    idee_ids = []
+    ordinaux = {}
+    gagnants = np.empty(len(duels), dtype=np.int64)
+    perdants = np.empty(len(duels), dtype=np.int64)
+    comptes = np.empty(len(duels), dtype=np.float64)
+
+    for k, duel in enumerate(duels):
+        for role, tableau in (("gagnant", gagnants), ("perdant", perdants)):
+            idee_id = duel["_id"][role]
+            if idee_id not in ordinaux:
+                ordinaux[idee_id] = len(idee_ids)
+                idee_ids.append(idee_id)
+            tableau[k] = ordinaux[idee_id]
+        comptes[k] = duel["nombre"]
+
+    return idee_ids, gagnants, perdants, comptes
+
+
+def duels_depuis_matrice(victoires):
+    """Convertir une matrice dense de victoires (victoires[i, j] = i bat j) en duels"""
+    victoires = np.asarray(victoires)
+    gagnants, perdants = np.nonzero(victoires)
+    return gagnants, perdants, victoires[gagnants, perdants].astype(np.float64)
+
+
+def matrice_victoires(n, gagnants, perdants, comptes):
+    """Matrice dense int32 des victoires (victoires[i, j] = i bat j), inverse de duels_depuis_matrice"""
+    victoires = np.zeros((n, n), dtype=np.int32)
+    np.add.at(victoires, (gagnants, perdants), comptes.astype(np.int32))
+    return victoires
+
+
+def ajuster_bradley_terry(n, gagnants, perdants, comptes, init=None, prior=PRIOR,
+                          tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """Ajuster les scores theta = log(p) ; init permet de repartir d'un ajustement précédent"""
+    theta = np.zeros(n) if init is None else np.asarray(init, dtype=np.float64).copy()
+
+    for _ in range(max_iterations):
+        p = np.exp(theta)
+        poids = comptes / (p[gagnants] + p[perdants])
+        # Victoires pondérées par la force de l'adversaire / défaites pondérées
+        numerateur = np.bincount(gagnants, weights=poids * p[perdants], minlength=n) + prior / (p + 1)
+        denominateur = np.bincount(perdants, weights=poids, minlength=n) + prior / (p + 1)
+        nouveau = np.log(numerateur / denominateur)
+        # Le modèle est invariant par translation : scores centrés sur une force moyenne de 1
+        nouveau -= nouveau.mean() if n else 0.0
+        ecart = np.max(np.abs(nouveau - theta)) if n else 0.0
+        theta = nouveau
+        if ecart < tolerance:
+            break
+
+    return theta, erreurs_types(theta, gagnants, perdants, comptes, prior)
+
+
+def erreurs_types(theta, gagnants, perdants, comptes, prior=PRIOR):
+    """Erreurs types des scores, tirées de l'information de Fisher"""
+    n = len(theta)
+    p = np.exp(theta)
+    poids = comptes * p[gagnants] * p[perdants] / (p[gagnants] + p[perdants]) ** 2
+    diagonale = (
+        np.bincount(gagnants, weights=poids, minlength=n)
+        + np.bincount(perdants, weights=poids, minlength=n)
+        + 2 * prior * p / (p + 1) ** 2
+    )
+
+    if n > LIMITE_INVERSION:
+        return 1 / np.sqrt(diagonale)
+
+    information = np.diag(diagonale)
+    np.add.at(information, (gagnants, perdants), -poids)
+    np.add.at(information, (perdants, gagnants), -poids)
+    return np.sqrt(np.diag(np.linalg.inv(information)))
+
+
+def probabilite_victoire(theta):
+    """Probabilité de battre une idée de force moyenne (adversaire de référence)"""
+    return 1 / (1 + np.exp(-np.asarray(theta)))
+
+
+def ajuster_question(idee_ids, gagnants, perdants, comptes, precedent=None):
+    """Ajuster une question en repartant des scores stockés ; renvoie (scores, erreurs) par idée"""
+    precedent = precedent or {}
+    init = np.array([precedent.get(str(idee_id), 0.0) for idee_id in idee_ids])
+    theta, erreurs = ajuster_bradley_terry(len(idee_ids), gagnants, perdants, comptes, init=init)
+    scores = {str(idee_id): float(t) for idee_id, t in zip(idee_ids, theta)}
+    return scores, {str(idee_id): float(e) for idee_id, e in zip(idee_ids, erreurs)}
+
+
+def enregistrer_classement(db, question_id, scores, erreurs, nb_votes):
+    """Stocker les scores d'une question pour les affichages et le prochain démarrage à chaud"""
+    document = {
+        "id_question": question_id,
+        "scores": scores,
+        "erreurs": erreurs,
+        "nb_votes": nb_votes,
+        "date_calcul": datetime.now()
+    }
+    db.classement_bt.update_one({"id_question": question_id}, {"$set": document}, upsert=True)
+    return document
+
+
+def classement_question(db, question_id, nb_votes, duels=None):
+    """Scores BT d'une question, réajustés seulement si le nombre de votes a changé.
+
+    duels : résultat de preparer_duels déjà chargé par l'appelant, sinon lu ici.
+    """
+    stocke = db.classement_bt.find_one({"id_question": question_id})
+    if stocke and stocke.get("nb_votes") == nb_votes:
+        return stocke
+
+    idee_ids, gagnants, perdants, comptes = duels or preparer_duels(charger_duels(db, question_id))
+    precedent = stocke.get("scores") if stocke else None
+    scores, erreurs = ajuster_question(idee_ids, gagnants, perdants, comptes, precedent)
+    return enregistrer_classement(db, question_id, scores, erreurs, nb_votes)
+
+
+def ajuster_tache(tache):
+    """Ajustement d'une question dans un processus séparé (tâche picklable)"""
+    question_id, idee_ids, gagnants, perdants, comptes, precedent, nb_votes = tache
+    scores, erreurs = ajuster_question(idee_ids, gagnants, perdants, comptes, precedent)
+    return question_id, scores, erreurs, nb_votes
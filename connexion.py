@@ -0,0 +1,93 @@
+"""Connexion à MongoDB, partagée par l'application et les commandes d'administration.
+
+Les paramètres viennent des variables d'environnement (ou d'un fichier .env),
+puis des secrets Streamlit (.streamlit/secrets.toml, non versionné : voir
+.streamlit/secrets.toml.example), puis des valeurs par défaut ci-dessous :
+
+    MONGO_URI                         URI du serveur (identifiants inclus)
+    MONGO_DB                          nom de la base
+    MONGO_POOL_MIN / MONGO_POOL_MAX   taille du pool de connexions
+    MONGO_SERVER_SELECTION_TIMEOUT_MS délai pour trouver un serveur disponible
+    MONGO_CONNECT_TIMEOUT_MS          délai d'ouverture d'une connexion
+    MONGO_SOCKET_TIMEOUT_MS           délai maximal d'une opération réseau
+    MONGO_COMPRESSORS                 compressions réseau, par ordre de préférence
+"""
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReadPreference
+
+from monitoring import statistiques_pool, suivi_commandes
+
+load_dotenv()
+
+# === Configuration MongoDB ===
+DEFAUTS = {
+    "MONGO_URI": "mongodb://localhost:27017",
+    "MONGO_DB": "Afq",
+    "MONGO_POOL_MIN": 0,
+    "MONGO_POOL_MAX": 50,
+    # 5 s au lieu des 30 s de pymongo : l'interface ne reste pas figée si le proxy ne répond plus
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": 5000,
+    "MONGO_CONNECT_TIMEOUT_MS": 5000,
+    "MONGO_SOCKET_TIMEOUT_MS": 30000,
+    # "snappy" peut être ajouté si python-snappy est installé
+    "MONGO_COMPRESSORS": "zstd,zlib",
+}
+
+
+FICHIER_SECRETS = Path(__file__).parent / ".streamlit" / "secrets.toml"
+
+
+def lire_secrets_fichier():
+    """Secrets Streamlit lus directement, pour les commandes lancées hors de Streamlit"""
+    if not FICHIER_SECRETS.exists():
+        return {}
+    try:
+        import tomllib
+    except ImportError:
+        # Python < 3.11 : le fichier existe mais ne peut pas être lu, ne pas basculer en silence sur localhost
+        print(f"❌ {FICHIER_SECRETS} ignoré : Python 3.11 requis pour le lire, "
+              "définissez MONGO_URI dans l'environnement ou dans .env")
+        return {}
+    with open(FICHIER_SECRETS, "rb") as fichier:
+        return tomllib.load(fichier)
+
+
+def lire_configuration(secrets=None):
+    """Paramètres de connexion : environnement, puis secrets, puis valeurs par défaut"""
+    if secrets is None:
+        secrets = lire_secrets_fichier()
+    configuration = {}
+    for cle, defaut in DEFAUTS.items():
+        valeur = os.environ.get(cle) or secrets.get(cle)
+        configuration[cle] = type(defaut)(valeur) if valeur is not None else defaut
+    return configuration
+
+
+def creer_client(configuration, ecouteurs=()):
+    """Client MongoDB configuré, avec les écouteurs de supervision (et d'éventuels écouteurs en plus)"""
+    return MongoClient(
+        configuration["MONGO_URI"],
+        minPoolSize=configuration["MONGO_POOL_MIN"],
+        maxPoolSize=configuration["MONGO_POOL_MAX"],
+        serverSelectionTimeoutMS=configuration["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        connectTimeoutMS=configuration["MONGO_CONNECT_TIMEOUT_MS"],
+        socketTimeoutMS=configuration["MONGO_SOCKET_TIMEOUT_MS"],
+        compressors=configuration["MONGO_COMPRESSORS"],
+        event_listeners=[statistiques_pool, suivi_commandes, *ecouteurs],
+        appname="wiki-survey-afrique"
+    )
+
+
+def creer_connexion(secrets=None):
+    """Créer un client MongoDB et retourner la base de l'application"""
+    configuration = lire_configuration(secrets)
+    client = creer_client(configuration)
+    return client[configuration["MONGO_DB"]]
+
+
+def base_analytique(db):
+    """Même base lue de préférence sur un secondaire, pour les agrégations du tableau de bord"""
+    return db.client.get_database(db.name, read_preference=ReadPreference.SECONDARY_PREFERRED)
@@ -0,0 +1,219 @@
+"""Intervalles de confiance bootstrap des scores des idées (collection intervalles_bt).
+
+Les votes d'une question sont lus une fois, sous forme de duels (gagnant,
+perdant, nombre). Rééchantillonner les votes avec remise revient à tirer les
+comptes des duels selon une loi multinomiale : chaque lot de tirages est une
+matrice (tirages × duels), et le modèle de Bradley-Terry est réajusté sur
+toutes les lignes à la fois. Les percentiles 2,5 % et 97,5 % donnent
+l'intervalle à 95 % du score BT et du taux de victoire de chaque idée.
+
+Les grandes questions répartissent les lots sur un pool de processus. Le
+résultat est stocké par question avec le nombre de votes : il n'est recalculé
+que lorsque de nouveaux votes sont arrivés.
+
+Le calcul ne passe jamais par le script d'une page : admin.py
+calculer-intervalles recalcule toutes les questions, et l'application lance
+un recalcul en arrière-plan (un seul à la fois par question) en affichant le
+dernier résultat stocké, même périmé.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from classement import PRIOR, charger_duels, preparer_duels, probabilite_victoire
+
+NB_TIRAGES = 1000
+# Tirages réajustés ensemble (mémoire : tirages × duels distincts)
+TAILLE_LOT = 100
+# Duels distincts à partir desquels les lots sont répartis sur des processus
+SEUIL_PROCESSUS = 20000
+NIVEAU = 0.95
+# Tolérance des réajustements, plus lâche que l'ajustement principal
+TOLERANCE = 1e-5
+MAX_ITERATIONS = 500
+# Délai minimal entre deux recalculs en arrière-plan d'une même question
+DELAI_RECALCUL = timedelta(seconds=60)
+
+_verrou = threading.Lock()
+_pool = None
+_en_cours = set()
+
+
+def pool_processus(processus=None):
+    """Pool de processus du module, créé une seule fois par processus.
+
+    Méthode spawn : un fork copierait les threads et le MongoClient du
+    processus appelant (serveur Streamlit).
+    """
+    global _pool
+    with _verrou:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processus, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def ajuster_lot(n, gagnants, perdants, comptes, init, prior=PRIOR,
+                tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """Ajuster Bradley-Terry sur chaque ligne de comptes (tirages × duels) ; renvoie theta (tirages × n)"""
+    taille = comptes.shape[0]
+    theta = np.tile(np.asarray(init, dtype=np.float64), (taille, 1))
+    # Indices aplatis : une plage de n cases par tirage pour un seul bincount
+    decalage = (np.arange(taille) * n)[:, None]
+    indices_gagnants = (decalage + gagnants).ravel()
+    indices_perdants = (decalage + perdants).ravel()
+
+    for _ in range(max_iterations):
+        p = np.exp(theta)
+        p_perdants = p[:, perdants]
+        poids = comptes / (p[:, gagnants] + p_perdants)
+        a_priori = prior / (p + 1)
+        numerateur = np.bincount(indices_gagnants, weights=(poids * p_perdants).ravel(),
+                                 minlength=taille * n).reshape(taille, n) + a_priori
+        denominateur = np.bincount(indices_perdants, weights=poids.ravel(),
+                                   minlength=taille * n).reshape(taille, n) + a_priori
+        nouveau = np.log(numerateur / denominateur)
+        nouveau -= nouveau.mean(axis=1, keepdims=True)
+        ecart = np.max(np.abs(nouveau - theta))
+        theta = nouveau
+        if ecart < tolerance:
+            break
+
+    return theta
+
+
+def tache_bootstrap(tache):
+    """Un lot de tirages (tâche picklable) : scores BT et taux de victoire (tirages × n)"""
+    n, gagnants, perdants, comptes, init, taille, graine = tache
+    rng = np.random.default_rng(graine)
+    nb_votes = int(comptes.sum())
+    tirages = rng.multinomial(nb_votes, comptes / nb_votes, size=taille).astype(np.float64)
+
+    theta = ajuster_lot(n, gagnants, perdants, tirages, init)
+
+    decalage = (np.arange(taille) * n)[:, None]
+    victoires = np.bincount((decalage + gagnants).ravel(), weights=tirages.ravel(),
+                            minlength=taille * n).reshape(taille, n)
+    defaites = np.bincount((decalage + perdants).ravel(), weights=tirages.ravel(),
+                           minlength=taille * n).reshape(taille, n)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        taux = victoires / (victoires + defaites)
+    return theta, taux
+
+
+def intervalles_bootstrap(n, gagnants, perdants, comptes, init=None, nb_tirages=NB_TIRAGES,
+                          processus=None, graine=0):
+    """Bornes (basse, haute) à 95 % du score BT (probabilité) et du taux de victoire de chaque idée"""
+    init = np.zeros(n) if init is None else init
+    tailles = [min(TAILLE_LOT, nb_tirages - debut) for debut in range(0, nb_tirages, TAILLE_LOT)]
+    graines = np.random.SeedSequence(graine).spawn(len(tailles))
+    taches = [(n, gagnants, perdants, comptes, init, taille, g) for taille, g in zip(tailles, graines)]
+
+    if len(comptes) >= SEUIL_PROCESSUS and len(taches) > 1:
+        resultats = list(pool_processus(processus).map(tache_bootstrap, taches))
+    else:
+        resultats = [tache_bootstrap(tache) for tache in taches]
+
+    theta = np.concatenate([r[0] for r in resultats])
+    taux = np.concatenate([r[1] for r in resultats])
+    quantiles = [(1 - NIVEAU) / 2 * 100, (1 + NIVEAU) / 2 * 100]
+    bornes_bt = probabilite_victoire(np.percentile(theta, quantiles, axis=0))
+    # Une idée absente d'un tirage n'a pas de taux : ignorée pour ce tirage
+    bornes_taux = np.nanpercentile(taux, quantiles, axis=0)
+    return bornes_bt, bornes_taux
+
+
+def intervalles_question(db, question_id, nb_votes, scores=None, processus=None, duels=None):
+    """Intervalles d'une question {id idée: {bt_bas, bt_haut, taux_bas, taux_haut}} (%), recalculés
+    seulement si le nombre de votes a changé ; scores (BT stockés) sert de point de départ,
+    duels (preparer_duels) évite de relire les votes"""
+    stocke = db.intervalles_bt.find_one({"id_question": question_id})
+    if stocke and stocke.get("nb_votes") == nb_votes:
+        return stocke["idees"]
+
+    idee_ids, gagnants, perdants, comptes = duels or preparer_duels(charger_duels(db, question_id))
+    idees = {}
+    if idee_ids:
+        scores = scores or {}
+        init = np.array([scores.get(str(idee_id), 0.0) for idee_id in idee_ids])
+        bornes_bt, bornes_taux = intervalles_bootstrap(
+            len(idee_ids), gagnants, perdants, comptes, init, processus=processus
+        )
+        idees = {
+            str(idee_id): {
+                "bt_bas": round(float(bornes_bt[0, k]) * 100, 2),
+                "bt_haut": round(float(bornes_bt[1, k]) * 100, 2),
+                "taux_bas": round(float(bornes_taux[0, k]) * 100, 2),
+                "taux_haut": round(float(bornes_taux[1, k]) * 100, 2),
+            }
+            for k, idee_id in enumerate(idee_ids)
+        }
+
+    db.intervalles_bt.update_one(
+        {"id_question": question_id},
+        {"$set": {
+            "idees": idees,
+            "nb_votes": nb_votes,
+            "nb_tirages": NB_TIRAGES,
+            "date_calcul": datetime.now(),
+        }},
+        upsert=True
+    )
+    return idees
+
+
+def intervalles_stockes(db, question_id):
+    """Dernier résultat stocké d'une question {idees, nb_votes, date_calcul}, None si jamais calculé"""
+    return db.intervalles_bt.find_one(
+        {"id_question": question_id}, {"_id": 0, "idees": 1, "nb_votes": 1, "date_calcul": 1}
+    )
+
+
+def recalculer_en_arriere_plan(db, executeur, question_id, nb_votes, stocke=None, scores=None, duels=None):
+    """intervalles_question dans executeur, sauf si un calcul de la question est en cours ou trop récent"""
+    if stocke and (stocke.get("nb_votes") == nb_votes
+                   or datetime.now() - stocke["date_calcul"] < DELAI_RECALCUL):
+        return None
+    with _verrou:
+        if question_id in _en_cours:
+            return None
+        _en_cours.add(question_id)
+
+    def tache():
+        try:
+            intervalles_question(db, question_id, nb_votes, scores, duels=duels)
+        except Exception as e:
+            print(f"❌ Erreur calcul des intervalles ({question_id}): {e}")
+        finally:
+            with _verrou:
+                _en_cours.discard(question_id)
+
+    return executeur.submit(tache)
+
+
+def recalculer_intervalles(db, processus=None):
+    """Recalculer les intervalles des questions ayant reçu des votes depuis le dernier calcul ; renvoie leur nombre"""
+    nb_votes_questions = {
+        resultat["_id"]: resultat["nb_votes"]
+        for resultat in db.idees.aggregate([
+            {"$group": {"_id": "$id_question", "nb_votes": {"$sum": "$victoires"}}}
+        ])
+    }
+    stockes = {
+        document["id_question"]: document.get("nb_votes")
+        for document in db.intervalles_bt.find({}, {"id_question": 1, "nb_votes": 1})
+    }
+    scores = {
+        document["id_question"]: document.get("scores")
+        for document in db.classement_bt.find({}, {"id_question": 1, "scores": 1})
+    }
+
+    recalculees = 0
+    for question_id, nb_votes in nb_votes_questions.items():
+        if not nb_votes or stockes.get(question_id) == nb_votes:
+            continue
+        intervalles_question(db, question_id, nb_votes, scores.get(question_id), processus)
+        recalculees += 1
+    return recalculees
@@ -0,0 +1,197 @@
+"""Migrations versionnées de la base MongoDB (collections, index, données initiales).
+
+La dernière version appliquée est stockée dans la collection schema_version ;
+seules les migrations de numéro supérieur sont exécutées. Elles ne sont
+lancées que par python admin.py migrer : l'application vérifie seulement que
+la base est à VERSION_SCHEMA. Un document verrou dans schema_version empêche
+deux processus de migrer en même temps.
+
+Certaines migrations reconstruisent des compteurs depuis tout l'historique
+(remplacement, pas $inc) : à lancer application arrêtée, sans quoi les votes
+écrits pendant la reconstruction seraient perdus pour ces compteurs.
+"""
+import os
+import socket
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError
+
+from activite import reconstruire_activite
+from analytics import reconstruire_sentiment_analytics
+from paires import attribuer_ordinaux, reconstruire_progression
+from segments import reconstruire_segments
+from votes import reconstruire_stats_idees
+
+
+def _collections_index_et_comptes(db):
+    """Créer les collections, les index de base et les comptes de test"""
+    # Créer les collections si elles n'existent pas
+    collections = [
+        "navigateur", "login", "question",
+        "idees", "vote", "commentaire",
+        "profil", "sentiment_analytics"
+    ]
+    existantes = set(db.list_collection_names())
+    for collection in collections:
+        if collection not in existantes:
+            db.create_collection(collection)
+
+    # Créer les index
+    db.login.create_index("email", unique=True)
+    db.idees.create_index("id_question")
+    db.vote.create_index([("id_navigateur", 1), ("id_question", 1)])
+    db.profil.create_index("id_navigateur", unique=True)
+    db.sentiment_analytics.create_index("id_question", unique=True)
+
+    # Insérer des données de test
+    db.login.update_one(
+        {"email": "admin@test.com"},
+        {"$set": {
+            "email": "admin@test.com",
+            "mot_de_passe": "admin123",
+            "date_creation": datetime.now()
+        }},
+        upsert=True
+    )
+
+    # Utilisateur avec droit d'image
+    db.login.update_one(
+        {"email": "yinnaasome@gmail.com"},
+        {"$set": {
+            "email": "yinnaasome@gmail.com",
+            "mot_de_passe": "abc",
+            "date_creation": datetime.now()
+        }},
+        upsert=True
+    )
+
+
+def _analytics_incrementales(db):
+    """Passer sentiment_analytics au format sommes/compteurs"""
+    reconstruire_sentiment_analytics(db)
+
+
+def _compteurs_idees(db):
+    """Initialiser victoires/défaites/apparitions des idées existantes"""
+    reconstruire_stats_idees(db)
+
+
+def _classement_bt(db):
+    """Index des scores Bradley-Terry stockés par question"""
+    db.classement_bt.create_index("id_question", unique=True)
+
+
+def _index_composes(db):
+    """Index couvrant chaque requête de l'application (voir python admin.py audit-index)"""
+    # Duels d'une question (classement) et recalcul des compteurs : parcours couvert par l'index
+    db.vote.create_index([("id_question", 1), ("id_idee_gagnant", 1), ("id_idee_perdant", 1)])
+    # Votes par jour : parcours d'intervalle sur la date
+    db.vote.create_index("date_vote")
+    # Listes de questions triées par date de création
+    db.question.create_index("date_creation")
+    # Idées d'une question dans l'ordre d'insertion, sans tri en mémoire
+    db.idees.create_index([("id_question", 1), ("_id", 1)])
+    if "id_question_1" in db.idees.index_information():
+        # Préfixe du nouvel index : redondant
+        db.idees.drop_index("id_question_1")
+    db.commentaire.create_index("id_question")
+
+
+def _progression(db):
+    """Ordinaux des idées et bitsets des paires votées par navigateur"""
+    db.idees.create_index([("id_question", 1), ("ordinal", 1)])
+    db.progression.create_index([("id_navigateur", 1), ("id_question", 1)], unique=True)
+    attribuer_ordinaux(db)
+    reconstruire_progression(db)
+
+
+def _activite(db):
+    """Cumuls d'activité par jour et par heure, calculés depuis l'historique"""
+    db.activite.create_index(
+        [("metrique", 1), ("id_question", 1), ("granularite", 1), ("periode", 1)], unique=True
+    )
+    reconstruire_activite(db)
+
+
+def _segments(db):
+    """Victoires et défaites des idées par segment de votants"""
+    db.stats_segment.create_index(
+        [("id_question", 1), ("dimension", 1), ("segment", 1), ("id_idee", 1)], unique=True
+    )
+    reconstruire_segments(db)
+
+
+def _intervalles_bt(db):
+    """Index des intervalles bootstrap stockés par question (calculés en arrière-plan ou par admin.py)"""
+    db.intervalles_bt.create_index("id_question", unique=True)
+
+
+# (version, description, fonction), dans l'ordre d'application
+MIGRATIONS = [
+    (1, "Collections, index et comptes initiaux", _collections_index_et_comptes),
+    (2, "Analytics de sentiment incrémentales", _analytics_incrementales),
+    (3, "Compteurs de votes portés par les idées", _compteurs_idees),
+    (4, "Classement Bradley-Terry", _classement_bt),
+    (5, "Index composés des votes, questions, idées et commentaires", _index_composes),
+    (6, "Ordinaux des idées et bitsets de progression", _progression),
+    (7, "Cumuls d'activité par jour et par heure", _activite),
+    (8, "Compteurs des idées par segment de votants", _segments),
+    (9, "Intervalles de confiance bootstrap des scores", _intervalles_bt),
+]
+
+
+VERSION_SCHEMA = MIGRATIONS[-1][0]
+# Un verrou non renouvelé pendant cette durée est considéré abandonné
+DUREE_VERROU = timedelta(hours=2)
+
+
+def prendre_verrou(db, detenteur):
+    """Prendre ou renouveler le verrou des migrations ; False s'il est tenu par un autre processus"""
+    maintenant = datetime.now()
+    try:
+        db.schema_version.find_one_and_update(
+            {"_id": "verrou", "$or": [{"detenteur": detenteur}, {"expiration": {"$lt": maintenant}}]},
+            {"$set": {"detenteur": detenteur, "expiration": maintenant + DUREE_VERROU}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def version_actuelle(db):
+    """Dernière version de migration appliquée (0 pour une base vierge)"""
+    document = db.schema_version.find_one({"_id": "schema"})
+    return document["version"] if document else 0
+
+
+def appliquer_migrations(db):
+    """Appliquer les migrations en attente sous verrou ; renvoie la liste (version, description) appliquée"""
+    detenteur = f"{socket.gethostname()}:{os.getpid()}"
+    if not prendre_verrou(db, detenteur):
+        verrou = db.schema_version.find_one({"_id": "verrou"}) or {}
+        expiration = verrou.get("expiration")
+        # Verrou relâché ou incomplet entre-temps : le message ne doit pas masquer la contention
+        echeance = f"verrou jusqu'au {expiration:%d/%m/%Y %H:%M}" if expiration else "échéance inconnue"
+        raise RuntimeError(f"migrations déjà en cours ({verrou.get('detenteur')}, {echeance})")
+
+    try:
+        # Version lue sous verrou : un processus précédent a pu migrer entre-temps
+        version = version_actuelle(db)
+        appliquees = []
+
+        for numero, description, migration in MIGRATIONS:
+            if numero <= version:
+                continue
+            migration(db)
+            db.schema_version.update_one(
+                {"_id": "schema"},
+                {"$set": {"version": numero, "date_migration": datetime.now()}},
+                upsert=True
+            )
+            appliquees.append((numero, description))
+            prendre_verrou(db, detenteur)
+
+        return appliquees
+    finally:
+        db.schema_version.delete_one({"_id": "verrou", "detenteur": detenteur})
@@ -0,0 +1,227 @@
+"""Supervision : écouteurs pymongo (pool de connexions, commandes) et chronométrage des pages.
+
+Les mesures sont gardées en mémoire dans des fenêtres glissantes de taille
+bornée ; chaque commande est rattachée à la page en cours d'exécution dans le
+thread qui l'a émise (« arriere-plan » pour les threads de l'application).
+"""
+import contextvars
+import functools
+import threading
+import time
+from collections import Counter, deque
+
+import numpy as np
+from pymongo import monitoring
+
+# Taille des fenêtres glissantes de mesures
+TAILLE_FENETRE_COMMANDES = 5000
+TAILLE_FENETRE_PAGES = 1000
+
+# Page ou fonction en cours dans le thread courant
+page_courante = contextvars.ContextVar("page_courante", default="arriere-plan")
+
+
+class StatistiquesPool(monitoring.ConnectionPoolListener):
+    """Compteurs du pool de connexions, alimentés par les événements pymongo"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._compteurs = Counter()
+        self._attente_totale = 0.0
+        self._attente_max = 0.0
+
+    def _incrementer(self, cle, valeur=1):
+        with self._verrou:
+            self._compteurs[cle] += valeur
+
+    def pool_created(self, event):
+        self._incrementer("pools_crees")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incrementer("pools_vides")
+
+    def pool_closed(self, event):
+        self._incrementer("pools_fermes")
+
+    def connection_created(self, event):
+        self._incrementer("connexions_creees")
+        self._incrementer("connexions_ouvertes")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incrementer("connexions_fermees")
+        self._incrementer("connexions_ouvertes", -1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incrementer("emprunts_echoues")
+
+    def connection_checked_out(self, event):
+        # duration : temps d'attente d'une connexion libre (pymongo >= 4.9)
+        attente = getattr(event, "duration", None) or 0.0
+        with self._verrou:
+            self._compteurs["emprunts"] += 1
+            self._compteurs["connexions_en_service"] += 1
+            self._attente_totale += attente
+            self._attente_max = max(self._attente_max, attente)
+
+    def connection_checked_in(self, event):
+        self._incrementer("connexions_en_service", -1)
+
+    def statistiques(self):
+        """Instantané des compteurs du pool"""
+        with self._verrou:
+            emprunts = self._compteurs["emprunts"]
+            return {
+                **{cle: self._compteurs[cle] for cle in (
+                    "connexions_ouvertes", "connexions_en_service", "connexions_creees",
+                    "connexions_fermees", "emprunts", "emprunts_echoues", "pools_vides"
+                )},
+                "attente_moyenne_ms": self._attente_totale / emprunts * 1000 if emprunts else 0.0,
+                "attente_max_ms": self._attente_max * 1000,
+            }
+
+
+# Instances uniques du processus, enregistrées sur chaque client créé par connexion.py
+statistiques_pool = StatistiquesPool()
+
+
+def _documents_retournes(reponse):
+    """Nombre de documents renvoyés (curseur) ou touchés (écriture) par une commande"""
+    curseur = reponse.get("cursor")
+    if curseur:
+        return len(curseur.get("firstBatch", curseur.get("nextBatch", [])))
+    return int(reponse.get("n", 0) or 0)
+
+
+class SuiviCommandes(monitoring.CommandListener):
+    """Durée et volume de chaque commande MongoDB, rattachés à la page courante"""
+
+    def __init__(self, taille=TAILLE_FENETRE_COMMANDES):
+        self._verrou = threading.Lock()
+        self._en_cours = {}
+        self.mesures = deque(maxlen=taille)
+        # Nombre de commandes par (collection, commande) depuis le démarrage, hors fenêtre
+        self.compteurs = Counter()
+
+    def started(self, event):
+        commande = event.command_name
+        collection = event.command.get(commande)
+        if commande == "getMore":
+            collection = event.command.get("collection")
+        with self._verrou:
+            self._en_cours[(event.connection_id, event.request_id)] = (
+                page_courante.get(), collection if isinstance(collection, str) else "", commande
+            )
+
+    def _terminer(self, event, documents, echec):
+        with self._verrou:
+            contexte = self._en_cours.pop((event.connection_id, event.request_id), None)
+            if contexte is None:
+                return
+            page, collection, commande = contexte
+            self.compteurs[(collection, commande)] += 1
+            self.mesures.append({
+                "horodatage": time.time(),
+                "page": page,
+                "collection": collection,
+                "commande": commande,
+                "duree_ms": event.duration_micros / 1000,
+                "documents": documents,
+                "echec": echec,
+            })
+
+    def succeeded(self, event):
+        self._terminer(event, _documents_retournes(event.reply), False)
+
+    def failed(self, event):
+        self._terminer(event, 0, True)
+
+    def totaux(self):
+        """Copie des compteurs cumulés par (collection, commande)"""
+        with self._verrou:
+            return Counter(self.compteurs)
+
+    def statistiques(self):
+        """p50/p95 par (page, collection, commande) sur la fenêtre"""
+        with self._verrou:
+            mesures = list(self.mesures)
+        groupes = {}
+        for mesure in mesures:
+            cle = (mesure["page"], mesure["collection"], mesure["commande"])
+            groupes.setdefault(cle, []).append(mesure)
+
+        lignes = []
+        for (page, collection, commande), groupe in groupes.items():
+            durees = np.array([m["duree_ms"] for m in groupe])
+            lignes.append({
+                "Page": page,
+                "Collection": collection,
+                "Commande": commande,
+                "Appels": len(groupe),
+                "p50 (ms)": round(float(np.percentile(durees, 50)), 2),
+                "p95 (ms)": round(float(np.percentile(durees, 95)), 2),
+                "Total (ms)": round(float(durees.sum()), 1),
+                "Documents (moy.)": round(float(np.mean([m["documents"] for m in groupe])), 1),
+                "Échecs": sum(m["echec"] for m in groupe),
+            })
+        return sorted(lignes, key=lambda ligne: ligne["Total (ms)"], reverse=True)
+
+
+class ChronometrePages:
+    """Durées d'exécution des points d'entrée de l'application"""
+
+    def __init__(self, taille=TAILLE_FENETRE_PAGES):
+        self._verrou = threading.Lock()
+        self.mesures = deque(maxlen=taille)
+
+    def enregistrer(self, page, duree):
+        with self._verrou:
+            self.mesures.append({"horodatage": time.time(), "page": page, "duree_ms": duree * 1000})
+
+    def statistiques(self):
+        """p50/p95 par page sur la fenêtre"""
+        with self._verrou:
+            mesures = list(self.mesures)
+        groupes = {}
+        for mesure in mesures:
+            groupes.setdefault(mesure["page"], []).append(mesure["duree_ms"])
+
+        return sorted((
+            {
+                "Page": page,
+                "Exécutions": len(durees),
+                "p50 (ms)": round(float(np.percentile(durees, 50)), 1),
+                "p95 (ms)": round(float(np.percentile(durees, 95)), 1),
+                "Max (ms)": round(float(np.max(durees)), 1),
+            }
+            for page, durees in groupes.items()
+        ), key=lambda ligne: ligne["p95 (ms)"], reverse=True)
+
+
+suivi_commandes = SuiviCommandes()
+chronometre_pages = ChronometrePages()
+
+
+def chronometrer(page):
+    """Décorateur : mesurer une fonction et lui rattacher les commandes MongoDB qu'elle émet"""
+    def decorateur(fonction):
+        @functools.wraps(fonction)
+        def mesuree(*args, **kwargs):
+            jeton = page_courante.set(page)
+            debut = time.perf_counter()
+            try:
+                return fonction(*args, **kwargs)
+            finally:
+                # Aussi exécuté sur st.rerun() / st.stop(), qui passent par des exceptions
+                chronometre_pages.enregistrer(page, time.perf_counter() - debut)
+                page_courante.reset(jeton)
+        return mesuree
+    return decorateur
@@ -0,0 +1,539 @@
+"""Moteur de service des paires d'idées à comparer.
+
+Chaque idée porte un ordinal dense propre à sa question (0, 1, 2... attribué
+par $inc sur question.nb_idees). La paire (i, j) avec i < j porte l'indice
+k = j*(j-1)/2 + i : cet indice ne dépend pas de n, donc l'ajout d'une idée ne
+renumérote aucune paire existante.
+
+Les paires votées par un navigateur sur une question sont stockées dans un
+document de la collection progression, sous forme de bitset : le bit k du mot
+mots.<k // 64> (Int64) vaut 1 si la paire k a été votée. Le document est mis à
+jour par $bit à l'écriture du vote ; tester ou tirer une paire libre est une
+opération sur les bits.
+
+Le choix de la prochaine paire est confié à une stratégie (STRATEGIES) :
+uniforme, équilibrage de l'exposition des idées (apparitions), ou paires dont
+l'écart de score Bradley-Terry est le plus incertain.
+"""
+import math
+import random
+import threading
+from collections import defaultdict, deque
+from math import isqrt
+
+from bson import Int64
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import PyMongoError
+
+# Nombre de tirages aléatoires avant de basculer sur un balayage séquentiel
+MAX_ESSAIS_TIRAGE = 64
+# Paires préchargées par file, et niveau sous lequel la file est complétée en arrière-plan
+TAILLE_FILE = 8
+SEUIL_RECHARGE = 3
+# Bits par mot du bitset stocké
+BITS_PAR_MOT = 64
+TAILLE_LOT = 1000
+# Paires libres tirées au hasard parmi lesquelles une stratégie choisit
+NB_CANDIDATS = 32
+# Erreur type attribuée à une idée absente du dernier classement
+ERREUR_INCONNUE = 2.0
+STRATEGIE_DEFAUT = "exposition"
+
+
+def nombre_paires(n):
+    """Nombre total de paires pour n idées"""
+    return n * (n - 1) // 2
+
+
+def indice_paire(i, j):
+    """Indice de la paire formée par les idées d'ordinaux i et j"""
+    if i > j:
+        i, j = j, i
+    return j * (j - 1) // 2 + i
+
+
+def paire_depuis_indice(k):
+    """Ordinaux (i, j), i < j, de la paire d'indice k"""
+    j = (1 + isqrt(1 + 8 * k)) // 2
+    i = k - j * (j - 1) // 2
+    return i, j
+
+
+class EnsemblePaires:
+    """Ensemble d'indices de paires sous forme de bitset (un bit par paire)"""
+
+    def __init__(self, octets=None):
+        self._octets = bytearray(octets or b"")
+        self._compte = int.from_bytes(self._octets, "little").bit_count()
+
+    @classmethod
+    def depuis_mots(cls, mots):
+        """Bitset à partir des mots Int64 d'un document progression ({"<w>": mot})"""
+        octets = bytearray()
+        for w, mot in (mots or {}).items():
+            debut = int(w) * BITS_PAR_MOT // 8
+            if len(octets) < debut + 8:
+                octets.extend(bytes(debut + 8 - len(octets)))
+            octets[debut:debut + 8] = (int(mot) & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "little")
+        return cls(octets)
+
+    def __contains__(self, k):
+        octet = k >> 3
+        return octet < len(self._octets) and bool(self._octets[octet] >> (k & 7) & 1)
+
+    def __len__(self):
+        return self._compte
+
+    def add(self, k):
+        octet = k >> 3
+        if octet >= len(self._octets):
+            self._octets.extend(bytes(octet + 1 - len(self._octets)))
+        if not self._octets[octet] >> (k & 7) & 1:
+            self._octets[octet] |= 1 << (k & 7)
+            self._compte += 1
+
+    def copy(self):
+        return EnsemblePaires(self._octets)
+
+    def premiere_libre(self, depart, total):
+        """Première paire non votée à partir de depart (circulairement), ou None"""
+        for debut, fin in ((depart, total), (0, depart)):
+            k = debut
+            while k < fin:
+                octet = k >> 3
+                if octet >= len(self._octets):
+                    return k
+                if self._octets[octet] == 0xFF:
+                    # Octet plein : huit paires votées d'un coup
+                    k = (octet + 1) << 3
+                elif self._octets[octet] >> (k & 7) & 1:
+                    k += 1
+                else:
+                    return k
+        return None
+
+
+def masques_mots(indices):
+    """Masques Int64 signés par mot ({"<w>": Int64}) pour les opérations $bit"""
+    masques = defaultdict(int)
+    for k in indices:
+        masques[k // BITS_PAR_MOT] |= 1 << (k % BITS_PAR_MOT)
+    return {
+        str(w): Int64(masque - (1 << 64) if masque >= 1 << 63 else masque)
+        for w, masque in masques.items()
+    }
+
+
+def operation_progression(id_navigateur, question_id, indices):
+    """Mise à jour $bit du document progression d'un navigateur pour une question"""
+    return UpdateOne(
+        {"id_navigateur": id_navigateur, "id_question": question_id},
+        {"$bit": {f"mots.{w}": {"or": masque} for w, masque in masques_mots(indices).items()}},
+        upsert=True
+    )
+
+
+def operations_progression_lot(db, votes):
+    """Opérations $bit d'un lot de votes, groupées par (navigateur, question)"""
+    idee_ids = {vote[champ] for vote in votes for champ in ("id_idee_gagnant", "id_idee_perdant")}
+    ordinaux = {
+        idee["_id"]: idee["ordinal"]
+        for idee in db.idees.find({"_id": {"$in": list(idee_ids)}}, {"ordinal": 1})
+        if "ordinal" in idee
+    }
+
+    indices = defaultdict(set)
+    for vote in votes:
+        i = ordinaux.get(vote["id_idee_gagnant"])
+        j = ordinaux.get(vote["id_idee_perdant"])
+        if i is not None and j is not None and i != j:
+            indices[(vote["id_navigateur"], vote["id_question"])].add(indice_paire(i, j))
+    return [
+        operation_progression(id_navigateur, question_id, paires)
+        for (id_navigateur, question_id), paires in indices.items()
+    ]
+
+
+def reserver_ordinal(db, question_id):
+    """Ordinal de la prochaine idée d'une question ($inc atomique sur question.nb_idees)"""
+    question = db.question.find_one_and_update(
+        {"_id": question_id},
+        {"$inc": {"nb_idees": 1}},
+        projection={"nb_idees": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return question["nb_idees"] - 1
+
+
+def liberer_ordinal(db, question_id, ordinal):
+    """Annuler la réservation d'un ordinal resté sans idée, s'il est toujours le dernier réservé.
+
+    Sinon le trou reste : admin.py reconstruire-progression --ordinaux
+    renumérote les idées.
+    """
+    annule = db.question.update_one(
+        {"_id": question_id, "nb_idees": ordinal + 1}, {"$inc": {"nb_idees": -1}}
+    ).modified_count
+    if not annule:
+        print(f"❌ Ordinal {ordinal} de la question {question_id} sans idée : "
+              "lancer admin.py reconstruire-progression --ordinaux")
+    return bool(annule)
+
+
+def inserer_idee(db, question_id, idee):
+    """Insérer une idée avec le prochain ordinal de sa question ; réservation annulée si l'insertion échoue"""
+    ordinal = reserver_ordinal(db, question_id)
+    try:
+        return db.idees.insert_one({**idee, "id_question": question_id, "ordinal": ordinal}).inserted_id
+    except PyMongoError:
+        liberer_ordinal(db, question_id, ordinal)
+        raise
+
+
+def charger_idees(db, question_id):
+    """Idées d'une question, par ordinal"""
+    return list(db.idees.find(
+        {"id_question": question_id},
+        {"_id": 1, "idee_texte": 1, "creer_par_utilisateur": 1, "ordinal": 1, "apparitions": 1}
+    ).sort("ordinal", 1))
+
+
+def charger_paires_votees(db, question_id, id_navigateur):
+    """Bitset des paires déjà votées par ce navigateur (document progression)"""
+    progression = db.progression.find_one(
+        {"id_navigateur": id_navigateur, "id_question": question_id},
+        {"_id": 0, "mots": 1}
+    )
+    return EnsemblePaires.depuis_mots(progression.get("mots") if progression else None)
+
+
+def compter_paires_restantes(n, paires_votees):
+    """Nombre de paires non votées, par simple soustraction"""
+    return nombre_paires(n) - len(paires_votees)
+
+
+def tirer_paire(n, paires_votees, rng=random):
+    """Tirer au hasard l'indice d'une paire non votée, ou None s'il n'en reste aucune"""
+    total = nombre_paires(n)
+    if total - len(paires_votees) <= 0:
+        return None
+
+    # Tirage avec rejet : rapide tant qu'une part raisonnable des paires reste libre
+    for _ in range(MAX_ESSAIS_TIRAGE):
+        k = rng.randrange(total)
+        if k not in paires_votees:
+            return k
+
+    # Presque tout est voté : première paire libre à partir d'une position aléatoire
+    return paires_votees.premiere_libre(rng.randrange(total), total)
+
+
+def _candidats(n, paires_votees, rng, nombre=NB_CANDIDATS):
+    """Jusqu'à `nombre` paires libres tirées uniformément (avec remise)"""
+    candidats = []
+    for _ in range(nombre):
+        k = tirer_paire(n, paires_votees, rng)
+        if k is None:
+            break
+        candidats.append(k)
+    return candidats
+
+
+def strategie_uniforme(n, paires_votees, rng, etat):
+    """Paire libre uniforme"""
+    return tirer_paire(n, paires_votees, rng)
+
+
+def strategie_exposition(n, paires_votees, rng, etat):
+    """Parmi les candidates, la paire dont les idées sont le moins apparues"""
+    apparitions = etat["apparitions"]
+    candidats = _candidats(n, paires_votees, rng)
+    if not candidats:
+        return None
+    return min(candidats, key=lambda k: (
+        sum(apparitions[o] for o in paire_depuis_indice(k)), rng.random()
+    ))
+
+
+def strategie_incertitude(n, paires_votees, rng, etat):
+    """Parmi les candidates, la paire dont l'issue et l'écart de scores sont les plus incertains"""
+    scores, erreurs = etat["scores"], etat["erreurs"]
+
+    def incertitude(k):
+        i, j = paire_depuis_indice(k)
+        p = 1 / (1 + math.exp(scores[j] - scores[i]))
+        # Variance de l'écart des scores, pondérée par l'information d'un duel
+        return p * (1 - p) * (erreurs[i] ** 2 + erreurs[j] ** 2), rng.random()
+
+    candidats = _candidats(n, paires_votees, rng)
+    if not candidats:
+        return None
+    return max(candidats, key=incertitude)
+
+
+# Stratégies de choix : fonction(n, paires_votees, rng, etat) -> indice de paire ou None
+STRATEGIES = {
+    "uniforme": strategie_uniforme,
+    "exposition": strategie_exposition,
+    "incertitude": strategie_incertitude,
+}
+
+
+def etat_idees(nombre):
+    """Apparitions, scores et erreurs types par ordinal, pour les stratégies"""
+    return {
+        "apparitions": [0] * nombre,
+        "scores": [0.0] * nombre,
+        "erreurs": [ERREUR_INCONNUE] * nombre,
+    }
+
+
+def compter_paires_restantes_par_question(db, id_navigateur):
+    """Paires restantes de chaque question pour un navigateur, en deux lectures"""
+    # Nombre d'idées par question, tenu à jour par reserver_ordinal
+    nb_idees = {
+        question["_id"]: question.get("nb_idees", 0)
+        for question in db.question.find({}, {"nb_idees": 1})
+    }
+
+    # Paires votées : population des bitsets du navigateur
+    nb_votees = {
+        progression["id_question"]: len(EnsemblePaires.depuis_mots(progression.get("mots")))
+        for progression in db.progression.find(
+            {"id_navigateur": id_navigateur}, {"_id": 0, "id_question": 1, "mots": 1}
+        )
+    }
+
+    return {
+        question_id: max(0, nombre_paires(n) - nb_votees.get(question_id, 0))
+        for question_id, n in nb_idees.items()
+    }
+
+
+def attribuer_ordinaux(db, question_ids=None):
+    """Numéroter les idées de chaque question par ordre d'insertion et mettre nb_idees à jour"""
+    filtre = {"_id": {"$in": list(question_ids)}} if question_ids is not None else {}
+    total = 0
+    for question in db.question.find(filtre, {"_id": 1}):
+        idees = db.idees.find({"id_question": question["_id"]}, {"_id": 1}).sort("_id", 1)
+        operations = [
+            UpdateOne({"_id": idee["_id"]}, {"$set": {"ordinal": i}})
+            for i, idee in enumerate(idees)
+        ]
+        for debut in range(0, len(operations), TAILLE_LOT):
+            db.idees.bulk_write(operations[debut:debut + TAILLE_LOT], ordered=False)
+        db.question.update_one({"_id": question["_id"]}, {"$set": {"nb_idees": len(operations)}})
+        total += len(operations)
+    return total
+
+
+def reconstruire_progression(db, question_ids=None):
+    """Recalculer nb_idees des questions et les bitsets progression à partir de la collection vote"""
+    filtre = {"id_question": {"$in": list(question_ids)}} if question_ids is not None else {}
+
+    # nb_idees d'après le plus grand ordinal : corrige une réservation restée sans idée en fin de numérotation
+    ordinaux_max = db.idees.aggregate([
+        {"$match": {**filtre, "ordinal": {"$exists": True}}},
+        {"$group": {"_id": "$id_question", "ordinal_max": {"$max": "$ordinal"}}}
+    ])
+    operations = [
+        UpdateOne({"_id": resultat["_id"]}, {"$set": {"nb_idees": resultat["ordinal_max"] + 1}})
+        for resultat in ordinaux_max
+    ]
+    for debut in range(0, len(operations), TAILLE_LOT):
+        db.question.bulk_write(operations[debut:debut + TAILLE_LOT], ordered=False)
+
+    ordinaux = {
+        idee["_id"]: idee["ordinal"]
+        for idee in db.idees.find(filtre, {"ordinal": 1})
+        if "ordinal" in idee
+    }
+
+    indices = defaultdict(set)
+    votes = db.vote.find(filtre, {"_id": 0, "id_navigateur": 1, "id_question": 1,
+                                  "id_idee_gagnant": 1, "id_idee_perdant": 1})
+    for vote in votes:
+        i = ordinaux.get(vote["id_idee_gagnant"])
+        j = ordinaux.get(vote["id_idee_perdant"])
+        if i is not None and j is not None and i != j:
+            indices[(vote["id_navigateur"], vote["id_question"])].add(indice_paire(i, j))
+
+    db.progression.delete_many(filtre)
+    operations = [
+        UpdateOne(
+            {"id_navigateur": id_navigateur, "id_question": question_id},
+            {"$set": {"mots": masques_mots(paires)}},
+            upsert=True
+        )
+        for (id_navigateur, question_id), paires in indices.items()
+    ]
+    for debut in range(0, len(operations), TAILLE_LOT):
+        db.progression.bulk_write(operations[debut:debut + TAILLE_LOT], ordered=False)
+    return len(operations)
+
+
+class FilePaires:
+    """File des prochaines paires d'une question pour un navigateur, complétée en arrière-plan.
+
+    Chaque entrée ne contient que les identifiants et les textes des deux idées.
+    Les paires votées depuis la session sont mémorisées localement : elles ne
+    reviennent pas même si l'écriture du vote n'est pas encore arrivée en base.
+    Les paires mises en file comptent comme des apparitions pour la stratégie.
+    """
+
+    def __init__(self, db, question_id, id_navigateur, executeur,
+                 taille=TAILLE_FILE, seuil=SEUIL_RECHARGE, rng=None, strategie=STRATEGIE_DEFAUT):
+        self.db = db
+        self.question_id = question_id
+        self.id_navigateur = id_navigateur
+        self.executeur = executeur
+        self.taille = taille
+        self.seuil = seuil
+        self.rng = rng or random.Random()
+        self.strategie = strategie
+        self._choisir = STRATEGIES[strategie]
+        # Idées soumises par des participants (affichage du type d'idée)
+        self.telechargees = set()
+
+        self._verrou = threading.Lock()
+        self._file = deque()
+        # Identifiant de l'idée de chaque ordinal (None pour un ordinal réservé sans idée)
+        self._idees = []
+        self._ordinaux = {}
+        self._textes = {}
+        self._paires_votees = EnsemblePaires()
+        self._etat = etat_idees(0)
+        self._votees_localement = set()
+        self._recharge = None
+
+        # Premier remplissage synchrone : la première paire doit s'afficher tout de suite
+        self.recharger()
+
+    def recharger(self):
+        """Relire les idées et le bitset du navigateur puis compléter la file"""
+        idees = charger_idees(self.db, self.question_id)
+        paires_votees = charger_paires_votees(self.db, self.question_id, self.id_navigateur)
+        classement = None
+        if self.strategie == "incertitude":
+            classement = self.db.classement_bt.find_one(
+                {"id_question": self.question_id}, {"scores": 1, "erreurs": 1}
+            )
+
+        with self._verrou:
+            self._idees = [None] * (max((idee["ordinal"] for idee in idees), default=-1) + 1)
+            self._etat = etat_idees(len(self._idees))
+            for idee in idees:
+                self._idees[idee["ordinal"]] = idee["_id"]
+                self._etat["apparitions"][idee["ordinal"]] = idee.get("apparitions", 0)
+                if classement:
+                    cle = str(idee["_id"])
+                    self._etat["scores"][idee["ordinal"]] = classement["scores"].get(cle, 0.0)
+                    self._etat["erreurs"][idee["ordinal"]] = classement["erreurs"].get(cle, ERREUR_INCONNUE)
+            self._ordinaux = {idee["_id"]: idee["ordinal"] for idee in idees}
+            self._textes = {idee["_id"]: idee["idee_texte"] for idee in idees}
+            self.telechargees = {idee["_id"] for idee in idees if idee.get("creer_par_utilisateur") == "oui"}
+            self._paires_votees = paires_votees
+            self._completer()
+
+    def _indice(self, id1, id2):
+        """Indice de la paire formée par deux idées connues"""
+        return indice_paire(self._ordinaux[id1], self._ordinaux[id2])
+
+    def _votees(self):
+        """Bitset des paires votées, en base ou localement"""
+        votees = self._paires_votees.copy()
+        for k in self._votees_localement:
+            votees.add(k)
+        return votees
+
+    def _completer(self):
+        """Tirer de nouvelles paires jusqu'à la taille de la file (verrou détenu)"""
+        exclues = self._votees()
+        for entree in self._file:
+            exclues.add(self._indice(*entree["ids"]))
+
+        while len(self._file) < self.taille:
+            k = self._choisir(len(self._idees), exclues, self.rng, self._etat)
+            if k is None:
+                break
+            exclues.add(k)
+            i, j = paire_depuis_indice(k)
+            if self._idees[i] is None or self._idees[j] is None:
+                continue
+            self._etat["apparitions"][i] += 1
+            self._etat["apparitions"][j] += 1
+            # Ordre d'affichage aléatoire pour éviter un biais de position
+            if self.rng.random() < 0.5:
+                i, j = j, i
+            self._file.append(self._entree(self._idees[i], self._idees[j]))
+
+    def _entree(self, id1, id2):
+        """Entrée de file : identifiants et textes seulement"""
+        return {"ids": (id1, id2), "textes": (self._textes[id1], self._textes[id2])}
+
+    def _recharger_si_besoin(self):
+        """Lancer un rechargement en arrière-plan si la file passe sous le seuil"""
+        if len(self._file) >= self.seuil:
+            return
+        if self._recharge is not None and not self._recharge.done():
+            return
+        self._recharge = self.executeur.submit(self.recharger)
+
+    def tete(self):
+        """Paire à afficher, ou None si toutes les paires ont été votées"""
+        with self._verrou:
+            if not self._file and self._recharge is not None and not self._recharge.done():
+                attente = self._recharge
+            else:
+                attente = None
+        if attente is not None:
+            attente.result()
+
+        with self._verrou:
+            self._recharger_si_besoin()
+            return self._file[0] if self._file else None
+
+    def voter(self, id1, id2):
+        """Retirer une paire votée de la file et ne plus la proposer"""
+        with self._verrou:
+            k = self._indice(id1, id2)
+            self._votees_localement.add(k)
+            self._file = deque(e for e in self._file if self._indice(*e["ids"]) != k)
+            self._recharger_si_besoin()
+
+    def passer(self):
+        """Remettre la paire de tête en fin de file"""
+        with self._verrou:
+            if len(self._file) > 1:
+                self._file.rotate(-1)
+
+    def injecter_idee(self, idee_id, texte, ordinal, telechargee=True):
+        """Ajouter une nouvelle idée et placer ses premières paires juste après la tête"""
+        with self._verrou:
+            if idee_id in self._textes:
+                return
+            autres = [autre for autre in self._idees if autre is not None]
+            if ordinal >= len(self._idees):
+                ajout = ordinal + 1 - len(self._idees)
+                self._idees.extend([None] * ajout)
+                for cle, valeurs in etat_idees(ajout).items():
+                    self._etat[cle].extend(valeurs)
+            self._idees[ordinal] = idee_id
+            self._ordinaux[idee_id] = ordinal
+            self._textes[idee_id] = texte
+            if telechargee:
+                self.telechargees.add(idee_id)
+
+            for autre in self.rng.sample(autres, min(self.taille, len(autres))):
+                paire = (idee_id, autre) if self.rng.random() < 0.5 else (autre, idee_id)
+                self._file.insert(min(1, len(self._file)), self._entree(*paire))
+
+    def total(self):
+        """Nombre total de paires de la question"""
+        with self._verrou:
+            return nombre_paires(len(self._ordinaux))
+
+    def restantes(self):
+        """Nombre de paires non votées"""
+        with self._verrou:
+            return compter_paires_restantes(len(self._ordinaux), self._votees())
@@ -0,0 +1,202 @@
+"""Victoires et défaites de chaque idée par segment de votants (collection stats_segment).
+
+Un segment est une valeur d'une dimension du profil : pays, tranche d'âge de
+dix ans ou sexe. Un document compte les victoires et défaites d'une idée parmi
+les votes des navigateurs d'un segment. La page de résultats lit ainsi un
+segment sans joindre vote et profil.
+
+Chaque vote est compté une seule fois, selon sa date et la date limite
+segments_reportes_jusqu_a posée sur le profil à sa création : les votes
+antérieurs sont reportés en une fois quand le profil arrive, les suivants sont
+comptés à leur écriture (profil du votant lu une fois par lot). Le report est
+réservé par le drapeau segments_reportes avant d'être appliqué : un second
+appel ne compte rien.
+"""
+from collections import Counter, defaultdict
+
+from pymongo import UpdateOne
+
+# Dimensions du profil et libellés affichés
+DIMENSIONS = {"pays": "Pays", "tranche_age": "Âge", "sexe": "Genre"}
+# Bornes des tranches d'âge, comme le graphique de distribution par âge
+AGE_MIN = 10
+AGE_MAX = 80
+# Valeurs de sexe qui ne forment pas un segment
+SEXES_IGNORES = {"", "Je préfère ne pas répondre"}
+TAILLE_LOT = 1000
+
+
+def tranche_age(age):
+    """Tranche de dix ans (« 20-29 », « 80+ ») ; None hors bornes ou inconnu"""
+    if not isinstance(age, (int, float)) or age < AGE_MIN:
+        return None
+    if age >= AGE_MAX:
+        return f"{AGE_MAX}+"
+    debut = int(age) // 10 * 10
+    return f"{debut}-{debut + 9}"
+
+
+def segments_profil(profil):
+    """{dimension: segment} d'un profil, dimensions non renseignées omises"""
+    if not profil:
+        return {}
+    segments = {
+        "pays": (profil.get("pays") or "").strip() or None,
+        "tranche_age": tranche_age(profil.get("age")),
+        "sexe": None if profil.get("sexe") in SEXES_IGNORES else profil.get("sexe"),
+    }
+    return {dimension: segment for dimension, segment in segments.items() if segment}
+
+
+def _operations(deltas, operateur="$inc"):
+    """Mises à jour d'un Counter {(question, dimension, segment, idée, champ): nombre}"""
+    par_document = defaultdict(dict)
+    for (question_id, dimension, segment, idee_id, champ), nombre in deltas.items():
+        par_document[(question_id, dimension, segment, idee_id)][champ] = nombre
+    operations = []
+    for (question_id, dimension, segment, idee_id), champs in par_document.items():
+        if operateur == "$set":
+            champs = {"victoires": 0, "defaites": 0, **champs}
+        operations.append(UpdateOne(
+            {"id_question": question_id, "dimension": dimension, "segment": segment, "id_idee": idee_id},
+            {operateur: champs},
+            upsert=True
+        ))
+    return operations
+
+
+def _ecrire(db, operations):
+    """Écrire des mises à jour par lots"""
+    for debut in range(0, len(operations), TAILLE_LOT):
+        db.stats_segment.bulk_write(operations[debut:debut + TAILLE_LOT], ordered=False)
+
+
+def _a_la_milliseconde(date):
+    """Date telle que stockée par MongoDB (précision milliseconde)"""
+    return date.replace(microsecond=date.microsecond // 1000 * 1000)
+
+
+def nouveau_profil(profil):
+    """Profil à insérer, avec la date limite des votes à reporter (les suivants sont comptés à l'écriture)"""
+    return {**profil, "segments_reportes_jusqu_a": profil["date_creation"], "segments_reportes": False}
+
+
+def charger_segments_navigateurs(db, ids_navigateurs):
+    """{id_navigateur: (segments, date limite du report)} des navigateurs ayant un profil, en une requête"""
+    return {
+        profil["id_navigateur"]: (segments_profil(profil), profil.get("segments_reportes_jusqu_a"))
+        for profil in db.profil.find(
+            {"id_navigateur": {"$in": list(set(ids_navigateurs))}},
+            {"id_navigateur": 1, "pays": 1, "age": 1, "sexe": 1, "segments_reportes_jusqu_a": 1}
+        )
+    }
+
+
+def operations_segments_lot(votes, segments_navigateurs):
+    """Mises à jour $inc des segments d'un lot de votes, une par (idée, segment)"""
+    deltas = Counter()
+    for vote in votes:
+        segments, date_limite = segments_navigateurs.get(vote["id_navigateur"], ({}, None))
+        if date_limite is not None and _a_la_milliseconde(vote["date_vote"]) <= date_limite:
+            # Vote antérieur au profil : compté par le report
+            continue
+        for dimension, segment in segments.items():
+            cle = (vote["id_question"], dimension, segment)
+            deltas[(*cle, vote["id_idee_gagnant"], "victoires")] += 1
+            deltas[(*cle, vote["id_idee_perdant"], "defaites")] += 1
+    return _operations(deltas)
+
+
+def _comptes_votes(db, segments_navigateurs, question_ids=None, jusqu_a=None):
+    """Victoires et défaites par segment des votes émis par des navigateurs profilés (jusqu'à une date incluse)"""
+    deltas = Counter()
+    navigateurs = list(segments_navigateurs)
+    for debut in range(0, len(navigateurs), TAILLE_LOT):
+        filtre = {"id_navigateur": {"$in": navigateurs[debut:debut + TAILLE_LOT]}}
+        if question_ids is not None:
+            filtre["id_question"] = {"$in": list(question_ids)}
+        if jusqu_a is not None:
+            filtre["date_vote"] = {"$lte": jusqu_a}
+        for champ_idee, champ in (("$id_idee_gagnant", "victoires"), ("$id_idee_perdant", "defaites")):
+            resultats = db.vote.aggregate([
+                {"$match": filtre},
+                {"$group": {
+                    "_id": {"navigateur": "$id_navigateur", "question": "$id_question", "idee": champ_idee},
+                    "nombre": {"$sum": 1}
+                }}
+            ], allowDiskUse=True)
+            for resultat in resultats:
+                groupe = resultat["_id"]
+                for dimension, segment in segments_navigateurs[groupe["navigateur"]].items():
+                    deltas[(groupe["question"], dimension, segment, groupe["idee"], champ)] += resultat["nombre"]
+    return deltas
+
+
+def reporter_votes_profil(db, id_navigateur):
+    """Ajouter aux segments d'un profil les votes émis avant sa création, une seule fois.
+
+    Les votes antérieurs encore en file d'écriture doivent avoir été écrits
+    avant l'appel (EcrivainVotes.apres_votes), sans quoi ils ne seraient
+    comptés nulle part.
+    """
+    # Report réservé avant d'être appliqué : deux appels ne comptent pas deux fois
+    profil = db.profil.find_one_and_update(
+        {"id_navigateur": id_navigateur, "segments_reportes": False},
+        {"$set": {"segments_reportes": True}}
+    )
+    segments = segments_profil(profil)
+    if not segments:
+        return 0
+    operations = _operations(_comptes_votes(
+        db, {id_navigateur: segments}, jusqu_a=profil["segments_reportes_jusqu_a"]
+    ))
+    _ecrire(db, operations)
+    return len(operations)
+
+
+def reconstruire_segments(db, question_ids=None):
+    """Recalculer les compteurs par segment depuis les votes et les profils"""
+    segments_navigateurs = {}
+    for profil in db.profil.find({}, {"id_navigateur": 1, "pays": 1, "age": 1, "sexe": 1}):
+        segments = segments_profil(profil)
+        if segments:
+            segments_navigateurs[profil["id_navigateur"]] = segments
+
+    deltas = _comptes_votes(db, segments_navigateurs, question_ids)
+    db.stats_segment.delete_many(
+        {"id_question": {"$in": list(question_ids)}} if question_ids is not None else {}
+    )
+    operations = _operations(deltas, "$set")
+    _ecrire(db, operations)
+    if question_ids is None:
+        # Tous les votes sont comptés : un report encore en attente compterait deux fois
+        db.profil.update_many({"segments_reportes": False}, {"$set": {"segments_reportes": True}})
+    return len(operations)
+
+
+def segments_question(db, question_id):
+    """{dimension: [(segment, nombre de votes)]} d'une question, segments les plus représentés d'abord"""
+    resultats = db.stats_segment.aggregate([
+        {"$match": {"id_question": question_id}},
+        {"$group": {
+            "_id": {"dimension": "$dimension", "segment": "$segment"},
+            "votes": {"$sum": "$victoires"}
+        }},
+        {"$sort": {"votes": -1}}
+    ])
+    segments = defaultdict(list)
+    for resultat in resultats:
+        if resultat["votes"]:
+            segments[resultat["_id"]["dimension"]].append((resultat["_id"]["segment"], resultat["votes"]))
+    return dict(segments)
+
+
+def charger_stats_segment(db, question_id, dimension, segment):
+    """{id_idee: (victoires, défaites)} des idées d'une question pour un segment"""
+    return {
+        document["id_idee"]: (document.get("victoires", 0), document.get("defaites", 0))
+        for document in db.stats_segment.find(
+            {"id_question": question_id, "dimension": dimension, "segment": segment},
+            {"_id": 0, "id_idee": 1, "victoires": 1, "defaites": 1}
+        )
+    }
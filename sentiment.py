@@ -0,0 +1,228 @@
+"""Analyse de sentiment des idées et commentaires.
+
+TextBlob n'est importé qu'au premier texte réellement analysé : le démarrage du
+processus ne paie pas le chargement du modèle. Les résultats sont mémorisés
+dans un cache LRU indexé par l'empreinte du texte normalisé (un même texte à
+la casse ou aux espaces près n'est analysé qu'une fois). L'écriture des scores
+sur les documents et dans sentiment_analytics peut être faite hors du thread
+de la requête, par un pool de threads.
+
+rescorer recalcule les scores déjà stockés (changement de modèle ou de seuils)
+en parcourant les collections par lots, avec reprise sur point de contrôle.
+"""
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from analytics import incrementer_sentiment, reconstruire_sentiment_analytics
+
+# Seuils de polarité des labels
+SEUIL_POSITIF = 0.1
+SEUIL_NEGATIF = -0.1
+# Nombre de textes mémorisés
+TAILLE_CACHE = 10000
+# Collection et champ texte des documents de chaque type de contenu
+COLLECTIONS = {"idees": "idees", "commentaires": "commentaire"}
+CHAMPS_TEXTE = {"idees": "idee_texte", "commentaires": "commentaire"}
+# Points de contrôle du recalcul, un document par type de contenu
+COLLECTION_REPRISE = "reprise_sentiment"
+TAILLE_LOT = 1000
+
+_verrou = threading.Lock()
+_cache = OrderedDict()
+_statistiques = {"succes": 0, "defauts": 0, "erreurs": 0}
+
+
+def normaliser(texte):
+    """Texte normalisé : Unicode NFC, minuscules, espaces réduits"""
+    texte = unicodedata.normalize("NFC", texte or "")
+    return re.sub(r"\s+", " ", texte).strip().lower()
+
+
+def empreinte(texte_normalise):
+    """Clé de cache d'un texte normalisé"""
+    return hashlib.blake2b(texte_normalise.encode("utf-8"), digest_size=16).digest()
+
+
+def label_sentiment(score):
+    """Label correspondant à une polarité"""
+    if score > SEUIL_POSITIF:
+        return "Positif"
+    if score < SEUIL_NEGATIF:
+        return "Négatif"
+    return "Neutre"
+
+
+def _polarite(texte_normalise):
+    """Polarité TextBlob (import au premier appel)"""
+    from textblob import TextBlob
+    return float(TextBlob(texte_normalise).sentiment.polarity)
+
+
+def analyser_lot(textes):
+    """(score, label) de chaque texte ; chaque texte distinct absent du cache est analysé une fois"""
+    normalises = [normaliser(texte) for texte in textes]
+    cles = [empreinte(texte) for texte in normalises]
+
+    scores = {}
+    a_calculer = {}
+    with _verrou:
+        for cle, texte in zip(cles, normalises):
+            if cle in _cache:
+                _cache.move_to_end(cle)
+                scores[cle] = _cache[cle]
+                _statistiques["succes"] += 1
+            elif cle not in a_calculer:
+                a_calculer[cle] = texte
+                _statistiques["defauts"] += 1
+
+    # Analyse hors verrou : les autres threads continuent de lire le cache
+    for cle, texte in a_calculer.items():
+        try:
+            scores[cle] = _polarite(texte)
+        except Exception as e:
+            print(f"❌ Erreur analyse de sentiment: {e}")
+            with _verrou:
+                _statistiques["erreurs"] += 1
+            scores[cle] = 0.0
+            continue
+        with _verrou:
+            _cache[cle] = scores[cle]
+            while len(_cache) > TAILLE_CACHE:
+                _cache.popitem(last=False)
+
+    return [(scores[cle], label_sentiment(scores[cle])) for cle in cles]
+
+
+def analyser(texte):
+    """(score, label) d'un texte"""
+    return analyser_lot([texte])[0]
+
+
+def enregistrer_sentiments(db, type_contenu, question_id, elements):
+    """Analyser les textes [(document_id, texte)], écrire les scores et les répercuter dans les analytics"""
+    resultats = analyser_lot([texte for _, texte in elements])
+    operations = [
+        UpdateOne({"_id": document_id}, {"$set": {"sentiment_score": score, "sentiment_label": label}})
+        for (document_id, _), (score, label) in zip(elements, resultats)
+    ]
+    db[COLLECTIONS[type_contenu]].bulk_write(operations, ordered=False)
+    incrementer_sentiment(db, question_id, type_contenu, resultats)
+    return resultats
+
+
+def enregistrer_en_arriere_plan(db, executeur, type_contenu, question_id, elements, apres=None):
+    """enregistrer_sentiments dans le pool de threads ; apres() est appelé une fois les scores écrits"""
+    def tache():
+        try:
+            enregistrer_sentiments(db, type_contenu, question_id, elements)
+        except PyMongoError as e:
+            print(f"❌ Erreur écriture des sentiments ({type_contenu}): {e}")
+            return
+        if apres is not None:
+            apres()
+
+    return executeur.submit(tache)
+
+
+def statistiques():
+    """Taille du cache, succès, défauts et erreurs d'analyse"""
+    with _verrou:
+        return {"taille": len(_cache), **_statistiques}
+
+
+# =============================================================
+# === RECALCUL DES SCORES STOCKÉS ===
+# =============================================================
+
+def _ecrire_lot(db, type_contenu, documents, resultats):
+    """Écrire les scores modifiés d'un lot ; renvoie (nombre modifié, questions touchées)"""
+    operations = []
+    questions = set()
+    for document, (score, label) in zip(documents, resultats):
+        if document.get("sentiment_score") == score and document.get("sentiment_label") == label:
+            continue
+        operations.append(UpdateOne(
+            {"_id": document["_id"]},
+            {"$set": {"sentiment_score": score, "sentiment_label": label}}
+        ))
+        questions.add(document["id_question"])
+    if operations:
+        db[COLLECTIONS[type_contenu]].bulk_write(operations, ordered=False)
+    return len(operations), questions
+
+
+def _rescorer_type(db, type_contenu, pool, taille_lot, en_vol, progression):
+    """Parcourir une collection après le point de contrôle et réécrire les scores par lots"""
+    reprise = db[COLLECTION_REPRISE].find_one({"_id": type_contenu}) or {}
+    if reprise.get("termine"):
+        return
+    champ = CHAMPS_TEXTE[type_contenu]
+    filtre = {"_id": {"$gt": reprise["dernier_id"]}} if "dernier_id" in reprise else {}
+    curseur = db[COLLECTIONS[type_contenu]].find(
+        filtre, {champ: 1, "id_question": 1, "sentiment_score": 1, "sentiment_label": 1}
+    ).sort("_id", 1).batch_size(taille_lot)
+
+    def terminer(lot, futur):
+        modifies, questions = _ecrire_lot(db, type_contenu, lot, futur.result())
+        # Point de contrôle après l'écriture : une reprise ne perd ni ne réécrit de lot entier
+        db[COLLECTION_REPRISE].update_one(
+            {"_id": type_contenu},
+            {
+                "$set": {"dernier_id": lot[-1]["_id"], "date": datetime.now()},
+                "$inc": {"traites": len(lot), "modifies": modifies},
+                "$addToSet": {"questions": {"$each": list(questions)}},
+            },
+            upsert=True
+        )
+        progression(type_contenu, len(lot), modifies)
+
+    # Lots analysés dans le pool de processus, écrits dans l'ordre de lecture
+    file = deque()
+    lot = []
+    for document in curseur:
+        lot.append(document)
+        if len(lot) == taille_lot:
+            file.append((lot, pool.submit(analyser_lot, [d.get(champ) or "" for d in lot])))
+            lot = []
+            while len(file) >= en_vol:
+                terminer(*file.popleft())
+    if lot:
+        file.append((lot, pool.submit(analyser_lot, [d.get(champ) or "" for d in lot])))
+    while file:
+        terminer(*file.popleft())
+
+    db[COLLECTION_REPRISE].update_one({"_id": type_contenu}, {"$set": {"termine": True}}, upsert=True)
+
+
+def rescorer(db, types=tuple(COLLECTIONS), processus=None, taille_lot=TAILLE_LOT,
+             recommencer=False, progression=lambda type_contenu, lus, modifies: None):
+    """Recalculer les scores stockés puis reconstruire les analytics des questions touchées.
+
+    Reprend au dernier point de contrôle sauf si recommencer ; renvoie
+    {type: (traités, modifiés)} et le nombre de questions reconstruites.
+    """
+    if recommencer:
+        db[COLLECTION_REPRISE].delete_many({"_id": {"$in": list(types)}})
+
+    with ProcessPoolExecutor(max_workers=processus) as pool:
+        # Deux lots en vol par processus : le pool ne reste pas inactif pendant les écritures
+        en_vol = 2 * (processus or os.cpu_count() or 1)
+        for type_contenu in types:
+            _rescorer_type(db, type_contenu, pool, taille_lot, en_vol, progression)
+
+    reprises = list(db[COLLECTION_REPRISE].find({"_id": {"$in": list(types)}}))
+    questions = {q for reprise in reprises for q in reprise.get("questions", [])}
+    reconstruites = reconstruire_sentiment_analytics(db, questions) if questions else 0
+    db[COLLECTION_REPRISE].delete_many({"_id": {"$in": list(types)}})
+
+    bilan = {reprise["_id"]: (reprise.get("traites", 0), reprise.get("modifies", 0)) for reprise in reprises}
+    return bilan, reconstruites
@@ -0,0 +1,254 @@
+"""Données du tableau de bord et de la page d'accueil, un jeu de données par graphique.
+
+Chaque jeu est mis en cache par st.cache_data avec une durée de vie, et sa clé
+de cache inclut un numéro de version. Une écriture (vote, idée, profil...)
+incrémente la version des seuls jeux qu'elle touche : la lecture suivante
+recalcule ces jeux, les autres restent en cache.
+
+charger lit plusieurs jeux en parallèle sur un pool de threads borné : une page
+attend sa requête la plus lente plutôt que la somme de ses requêtes, et un jeu
+hors délai est simplement absent du résultat.
+"""
+import contextvars
+import functools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pymongo
+import streamlit as st
+from bson import ObjectId
+
+from activite import depuis_jours, serie_activite
+from classement import charger_duels, preparer_duels
+
+# Durée de vie des jeux en cache (secondes), pour les écritures faites par d'autres processus
+DUREE_CACHE = 300
+# Entrées gardées en cache : les versions périmées sont évincées sans attendre leur expiration
+MAX_ENTREES_CACHE = 64
+# Jeux volumineux (duels d'une question, une entrée par nombre de votes) : cache séparé et petit,
+# pour ne pas évincer les petits jeux du tableau de bord
+MAX_ENTREES_CACHE_VOLUMINEUX = 4
+
+# Lectures simultanées par processus Streamlit (pool du module) et délai de chaque lecture (secondes)
+NB_LECTURES_PARALLELES = 8
+DELAI_LECTURE = 10
+
+# Jeux de données invalidés par chaque type d'écriture ; duels n'y figure pas,
+# nb_votes fait partie de sa clé
+DEPENDANCES = {
+    "question": ("totaux", "questions_par_periode"),
+    "idee": ("totaux", "idees_par_type", "sentiment"),
+    "commentaire": ("sentiment",),
+    "vote": ("totaux", "votes_par_periode"),
+    "navigateur": ("totaux",),
+    "profil": ("pays", "ages"),
+}
+
+_verrou = threading.Lock()
+_versions = Counter()
+_appels = Counter()
+_calculs = Counter()
+_executeur = ThreadPoolExecutor(max_workers=NB_LECTURES_PARALLELES, thread_name_prefix="tableau-de-bord")
+
+
+def signaler_ecriture(type_ecriture):
+    """Invalider les jeux de données touchés par une écriture"""
+    with _verrou:
+        for jeu in DEPENDANCES[type_ecriture]:
+            _versions[jeu] += 1
+
+
+def statistiques_cache():
+    """Appels, calculs (défauts de cache) et succès par jeu de données"""
+    with _verrou:
+        jeux = sorted(set(_appels) | set(_versions))
+        return [
+            {
+                "Jeu de données": jeu,
+                "Appels": _appels[jeu],
+                "Calculs": _calculs[jeu],
+                "Succès": _appels[jeu] - _calculs[jeu],
+                "Taux de succès (%)": round(100 * (_appels[jeu] - _calculs[jeu]) / _appels[jeu], 1) if _appels[jeu] else 0.0,
+                "Version": _versions[jeu],
+            }
+            for jeu in jeux
+        ]
+
+
+@st.cache_data(ttl=DUREE_CACHE, max_entries=MAX_ENTREES_CACHE, show_spinner=False)
+def _en_cache(_calcul, _db, nom, version, *args):
+    """Exécuter un calcul ; la clé de cache est (nom, version, args)"""
+    with _verrou:
+        _calculs[nom] += 1
+    return _calcul(_db, *args)
+
+
+@st.cache_data(ttl=DUREE_CACHE, max_entries=MAX_ENTREES_CACHE_VOLUMINEUX, show_spinner=False)
+def _en_cache_volumineux(_calcul, _db, nom, version, *args):
+    """Comme _en_cache, dans un cache séparé de quelques entrées"""
+    with _verrou:
+        _calculs[nom] += 1
+    return _calcul(_db, *args)
+
+
+def jeu_de_donnees(nom, volumineux=False):
+    """Décorateur : lecture en cache du jeu `nom`, calcul direct disponible via .calculer"""
+    en_cache = _en_cache_volumineux if volumineux else _en_cache
+
+    def decorateur(calcul):
+        @functools.wraps(calcul)
+        def lire(db, *args):
+            with _verrou:
+                _appels[nom] += 1
+                version = _versions[nom]
+            return en_cache(calcul, db, nom, version, *args)
+
+        lire.calculer = calcul
+        return lire
+    return decorateur
+
+
+# =============================================================
+# === LECTURE PARALLÈLE ===
+# =============================================================
+
+def _lire(jeu, db, args, delai):
+    """Lire un jeu ; pymongo.timeout interrompt aussi la requête côté serveur (maxTimeMS)"""
+    with pymongo.timeout(delai):
+        return jeu(db, *args)
+
+
+def charger(db, demandes, delai=DELAI_LECTURE):
+    """Lire en parallèle les jeux {clé: (jeu, args)}.
+
+    Renvoie {clé: résultat} ; un jeu en erreur ou sans réponse après `delai`
+    secondes est absent du résultat, à l'appelant d'afficher un remplaçant.
+    """
+    # Une copie du contexte par lecture : les commandes restent attribuées à la page appelante
+    futurs = {
+        cle: _executeur.submit(contextvars.copy_context().run, _lire, jeu, db, args, delai)
+        for cle, (jeu, args) in demandes.items()
+    }
+    wait(futurs.values(), timeout=delai)
+
+    resultats = {}
+    for cle, futur in futurs.items():
+        if not futur.done():
+            futur.cancel()
+            print(f"❌ Jeu de données {cle} hors délai ({delai} s)")
+            continue
+        try:
+            resultats[cle] = futur.result()
+        except Exception as e:
+            # Toute erreur, MongoDB ou non, dégrade ce seul graphique comme un dépassement de délai
+            print(f"❌ Erreur jeu de données {cle}: {e}")
+    return resultats
+
+
+# =============================================================
+# === JEUX DE DONNÉES ===
+# =============================================================
+
+@jeu_de_donnees("totaux")
+def totaux(db):
+    """Nombre de questions, idées, votes et participants (métadonnées des collections, sans parcours)"""
+    return {
+        "questions": db.question.estimated_document_count(),
+        "idees": db.idees.estimated_document_count(),
+        "votes": db.vote.estimated_document_count(),
+        "participants": db.navigateur.estimated_document_count(),
+    }
+
+
+@jeu_de_donnees("idees_par_type")
+def idees_par_type(db):
+    """Nombre d'idées originales et téléchargées"""
+    return list(db.idees.aggregate([
+        {"$group": {
+            "_id": "$creer_par_utilisateur",
+            "count": {"$sum": 1}
+        }}
+    ]))
+
+
+def granularite_plage(jours):
+    """Par heure sur une semaine au plus, par jour au-delà"""
+    return "heure" if jours is not None and jours <= 7 else "jour"
+
+
+@jeu_de_donnees("votes_par_periode")
+def votes_par_periode(db, jours=30):
+    """Votes par jour (ou par heure) sur les `jours` derniers jours, None pour tout l'historique"""
+    return serie_activite(db, "votes", granularite_plage(jours), depuis_jours(jours))
+
+
+@jeu_de_donnees("questions_par_periode")
+def questions_par_periode(db, jours=None):
+    """Questions créées par jour (ou par heure) sur les `jours` derniers jours, None pour tout"""
+    return serie_activite(db, "questions", granularite_plage(jours), depuis_jours(jours))
+
+
+@jeu_de_donnees("sentiment")
+def sentiment(db):
+    """Répartition des labels de sentiment des idées puis des commentaires"""
+    resultats_idees = list(db.idees.aggregate([
+        {"$match": {"sentiment_label": {"$exists": True}}},
+        {"$group": {
+            "_id": {"$concat": ["Idées - ", "$sentiment_label"]},
+            "count": {"$sum": 1},
+            "avg_score": {"$avg": "$sentiment_score"}
+        }}
+    ]))
+    resultats_comms = list(db.commentaire.aggregate([
+        {"$match": {"sentiment_label": {"$exists": True}}},
+        {"$group": {
+            "_id": {"$concat": ["Commentaires - ", "$sentiment_label"]},
+            "count": {"$sum": 1},
+            "avg_score": {"$avg": "$sentiment_score"}
+        }}
+    ]))
+    return resultats_idees, resultats_comms
+
+
+@jeu_de_donnees("pays")
+def pays(db):
+    """Dix pays comptant le plus de participants"""
+    return list(db.profil.aggregate([
+        {"$match": {"pays": {"$exists": True, "$ne": ""}}},
+        {"$group": {
+            "_id": "$pays",
+            "count": {"$sum": 1}
+        }},
+        {"$sort": {"count": -1}},
+        {"$limit": 10}
+    ]))
+
+
+@jeu_de_donnees("ages")
+def ages(db):
+    """Participants par tranche d'âge de dix ans"""
+    return list(db.profil.aggregate([
+        {"$match": {"age": {"$exists": True, "$ne": None}}},
+        {"$bucket": {
+            "groupBy": "$age",
+            "boundaries": [10, 20, 30, 40, 50, 60, 70, 80],
+            "default": "80+",
+            "output": {
+                "count": {"$sum": 1}
+            }
+        }}
+    ]))
+
+
+@jeu_de_donnees("duels", volumineux=True)
+def duels(db, question_id, nb_votes):
+    """Duels préparés d'une question (identifiants des idées en texte, gagnants, perdants, comptes).
+
+    Une seule agrégation sur les votes de la question, partagée par le
+    classement, les intervalles et le face-à-face. question_id est passé en
+    texte (hachable par la clé de cache) ; nb_votes ne sert qu'à la clé : un
+    nouveau vote, même écrit par un autre processus, donne de nouveaux duels.
+    """
+    idee_ids, gagnants, perdants, comptes = preparer_duels(charger_duels(db, ObjectId(question_id)))
+    return [str(idee_id) for idee_id in idee_ids], gagnants, perdants, comptes
@@ -0,0 +1,378 @@
+"""Écriture des votes et des compteurs victoires/défaites/apparitions portés par les idées.
+
+Deux chemins d'écriture : inserer_vote (synchrone, un vote) et EcrivainVotes,
+qui regroupe les votes de tout le processus et les écrit par lots dans un
+thread dédié. Les deux mettent aussi à jour le bitset progression du navigateur,
+les cumuls d'activité (votes par jour et par heure) et, si le votant a rempli
+son profil, les compteurs par segment.
+
+Ces écritures ne sont pas atomiques : le vote est inséré, puis les compteurs
+mis à jour par des commandes distinctes (pas de transaction, qui exigerait un
+replica set). Une panne entre les deux laisse les compteurs en retard sur la
+collection vote, qui fait foi : reconstruire_stats_idees (admin.py
+reconstruire-stats-idees) les recalcule.
+"""
+import atexit
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from activite import operations_activite
+from paires import operations_progression_lot
+from segments import charger_segments_navigateurs, operations_segments_lot
+
+# Taille des lots d'écriture lors des reconstructions
+TAILLE_LOT = 1000
+# Reprises d'une écriture en échec : attente initiale doublée à chaque tentative, plafonnée
+NB_TENTATIVES = 6
+DELAI_REPRISE = 0.2
+DELAI_REPRISE_MAX = 10.0
+# Code d'erreur MongoDB d'une clé en double
+CLE_EN_DOUBLE = 11000
+
+
+def operations_compteurs(gagnant, perdant):
+    """Mises à jour $inc des compteurs des deux idées d'un vote"""
+    return [
+        UpdateOne({"_id": gagnant}, {"$inc": {"victoires": 1, "apparitions": 1}}),
+        UpdateOne({"_id": perdant}, {"$inc": {"defaites": 1, "apparitions": 1}}),
+    ]
+
+
+def document_vote(id_navigateur, question_id, gagnant, perdant):
+    """Document de la collection vote"""
+    return {
+        "id_navigateur": id_navigateur,
+        "id_question": question_id,
+        "id_idee_gagnant": gagnant,
+        "id_idee_perdant": perdant,
+        "date_vote": datetime.now()
+    }
+
+
+def inserer_vote(db, id_navigateur, question_id, gagnant, perdant):
+    """Enregistrer un vote, incrémenter les compteurs des deux idées et marquer la paire votée.
+
+    Non atomique : le vote est écrit en premier, les compteurs ensuite.
+    """
+    vote = document_vote(id_navigateur, question_id, gagnant, perdant)
+    # Vote daté avant la lecture du profil : un profil créé entre-temps le compte dans son report
+    segments = operations_segments_lot([vote], charger_segments_navigateurs(db, [id_navigateur]))
+    db.vote.insert_one(vote)
+    db.idees.bulk_write(operations_compteurs(gagnant, perdant), ordered=False)
+    progression = operations_progression_lot(db, [vote])
+    if progression:
+        db.progression.bulk_write(progression, ordered=False)
+    db.activite.bulk_write(operations_activite("votes", [(vote["date_vote"], question_id)]), ordered=False)
+    if segments:
+        db.stats_segment.bulk_write(segments, ordered=False)
+
+
+def operations_compteurs_lot(votes):
+    """Mises à jour $inc des idées d'un lot de votes, une seule par idée"""
+    deltas = defaultdict(Counter)
+    for vote in votes:
+        deltas[vote["id_idee_gagnant"]].update(victoires=1, apparitions=1)
+        deltas[vote["id_idee_perdant"]].update(defaites=1, apparitions=1)
+    return [UpdateOne({"_id": idee_id}, {"$inc": dict(delta)}) for idee_id, delta in deltas.items()]
+
+
+class EcrivainVotes:
+    """Écriture différée des votes : file bornée vidée par lots dans un thread dédié.
+
+    Un lot part dès qu'il atteint taille_lot votes ou que delai_max secondes se
+    sont écoulées depuis son premier vote. Quand la file est pleine, soumettre
+    attend jusqu'à attente_max secondes puis écrit le vote directement
+    (contre-pression). Les votes en attente sont écrits à l'arrêt du processus.
+
+    Une erreur MongoDB est réessayée avec une attente exponentielle ; un lot
+    dont l'insertion échoue encore est remis en fin de file. Les mises à jour
+    des compteurs ne portent que sur les votes réellement insérés.
+
+    apres_ecriture() est appelé une fois les votes d'un lot et leurs compteurs
+    écrits : c'est là, et non à la soumission, que les caches lus par le
+    tableau de bord doivent être invalidés. apres_votes() confie au thread de
+    l'écrivain une tâche qui attend les votes d'un seul navigateur.
+    """
+
+    def __init__(self, db, taille_lot=500, delai_max=0.5, capacite=20000, attente_max=1.0,
+                 apres_ecriture=None):
+        self.db = db
+        self.taille_lot = taille_lot
+        self.delai_max = delai_max
+        self.attente_max = attente_max
+        self.apres_ecriture = apres_ecriture
+
+        self._file = queue.Queue(maxsize=capacite)
+        self._arret = threading.Event()
+        self._verrou = threading.Lock()
+        self._compteurs = Counter()
+        self._latence_derniere = 0.0
+        self._latence_max = 0.0
+        # Votes soumis et pas encore écrits (ou perdus) par navigateur, et tâches qui les attendent
+        self._en_attente = Counter()
+        self._rappels = defaultdict(list)
+
+        self._thread = threading.Thread(target=self._boucle, name="ecrivain-votes", daemon=True)
+        self._thread.start()
+        atexit.register(self.arreter)
+
+    def soumettre(self, id_navigateur, question_id, gagnant, perdant):
+        """Mettre un vote en file ; ne bloque que si la file est pleine"""
+        vote = document_vote(id_navigateur, question_id, gagnant, perdant)
+        with self._verrou:
+            self._compteurs["recus"] += 1
+        self._ajuster_en_attente([vote], 1)
+        try:
+            self._file.put(vote, timeout=self.attente_max)
+        except queue.Full:
+            # Contre-pression : la file ne se vide pas assez vite, écriture directe
+            with self._verrou:
+                self._compteurs["ecritures_directes"] += 1
+            try:
+                self._ecrire([vote])
+            finally:
+                self._ajuster_en_attente([vote], -1)
+
+    def apres_votes(self, id_navigateur, fonction):
+        """Appeler fonction() dans le thread de l'écrivain dès que les votes soumis par le navigateur sont écrits"""
+        with self._verrou:
+            self._rappels[id_navigateur].append(fonction)
+
+    def _ajuster_en_attente(self, votes, delta):
+        """Ajouter delta aux votes non écrits des navigateurs d'une liste de votes"""
+        with self._verrou:
+            for vote in votes:
+                self._en_attente[vote["id_navigateur"]] += delta
+                if self._en_attente[vote["id_navigateur"]] <= 0:
+                    del self._en_attente[vote["id_navigateur"]]
+
+    def _executer_rappels(self):
+        """Exécuter les tâches des navigateurs qui n'ont plus de vote en attente"""
+        with self._verrou:
+            prets = [id_navigateur for id_navigateur in self._rappels if not self._en_attente[id_navigateur]]
+            fonctions = [fonction for id_navigateur in prets for fonction in self._rappels.pop(id_navigateur)]
+        for fonction in fonctions:
+            try:
+                fonction()
+            except Exception as e:
+                print(f"❌ Erreur d'une tâche après écriture des votes: {e}")
+
+    def _boucle(self):
+        """Former les lots et les écrire jusqu'à l'arrêt, puis vider la file"""
+        while not (self._arret.is_set() and self._file.empty()):
+            self._executer_rappels()
+            try:
+                lot = [self._file.get(timeout=self.delai_max)]
+            except queue.Empty:
+                continue
+
+            echeance = time.monotonic() + self.delai_max
+            while len(lot) < self.taille_lot:
+                restant = echeance - time.monotonic()
+                try:
+                    if restant > 0:
+                        lot.append(self._file.get(timeout=restant))
+                    else:
+                        # Délai écoulé : compléter le lot avec les votes déjà en file, sans attendre
+                        lot.append(self._file.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._ecrire(lot)
+            except Exception as e:
+                # Erreur imprévue : signalée, le thread continue de vider la file
+                print(f"❌ Erreur imprévue de l'écrivain de votes ({len(lot)} vote(s)): {e}")
+                self._incrementer("echecs", len(lot))
+            finally:
+                # Après une éventuelle remise en file : les votes remis restent en attente
+                self._ajuster_en_attente(lot, -1)
+        self._executer_rappels()
+
+    def _incrementer(self, compteur, nombre=1):
+        """Incrémenter un compteur de statistiques"""
+        with self._verrou:
+            self._compteurs[compteur] += nombre
+
+    def _reessayer(self, description, fonction):
+        """Appeler fonction en réessayant les erreurs MongoDB, avec attente exponentielle.
+
+        Un BulkWriteError n'est pas réessayé : une partie des écritures est déjà
+        appliquée. La dernière erreur est relevée après NB_TENTATIVES essais.
+        """
+        for tentative in range(NB_TENTATIVES):
+            try:
+                return fonction()
+            except BulkWriteError:
+                raise
+            except PyMongoError as e:
+                if tentative == NB_TENTATIVES - 1:
+                    print(f"❌ {description} : abandon après {NB_TENTATIVES} tentatives ({e})")
+                    raise
+                self._incrementer("reprises")
+                time.sleep(min(DELAI_REPRISE * 2 ** tentative, DELAI_REPRISE_MAX))
+
+    def _inserer(self, lot):
+        """Insertion non ordonnée ; renvoie les votes présents en base après l'appel"""
+        try:
+            self.db.vote.insert_many(lot, ordered=False)
+            return lot
+        except BulkWriteError as e:
+            # Clé en double : vote déjà inséré par une tentative précédente (les _id sont fixés au premier essai)
+            erreurs = [erreur for erreur in e.details["writeErrors"] if erreur["code"] != CLE_EN_DOUBLE]
+            refuses = {erreur["index"] for erreur in erreurs}
+            if refuses:
+                print(f"❌ {len(refuses)} vote(s) refusé(s) par la base: {erreurs[0]['errmsg']}")
+                self._incrementer("echecs", len(refuses))
+            return [vote for indice, vote in enumerate(lot) if indice not in refuses]
+
+    def _remettre_en_file(self, lot):
+        """Remettre en fin de file un lot non inséré ; perdu (et compté) si l'écrivain s'arrête ou la file est pleine"""
+        remis = 0
+        # Compté en attente avant d'être remis : le thread pourrait l'écrire aussitôt
+        self._ajuster_en_attente(lot, 1)
+        if not self._arret.is_set():
+            for vote in lot:
+                try:
+                    self._file.put_nowait(vote)
+                except queue.Full:
+                    break
+                remis += 1
+        self._ajuster_en_attente(lot[remis:], -1)
+        self._incrementer("remis_en_file", remis)
+        if remis < len(lot):
+            print(f"❌ {len(lot) - remis} vote(s) perdu(s) : file pleine ou écrivain arrêté")
+            self._incrementer("echecs", len(lot) - remis)
+
+    def _ecrire(self, lot):
+        """Insertion non ordonnée du lot puis mises à jour groupées des compteurs, bitsets et segments"""
+        debut = time.perf_counter()
+        try:
+            # Profils du lot lus avant l'insertion : un profil créé entre-temps compte ces votes dans son report
+            segments_navigateurs = self._reessayer(
+                "Lecture des profils",
+                lambda: charger_segments_navigateurs(self.db, [vote["id_navigateur"] for vote in lot])
+            )
+            inseres = self._reessayer("Insertion des votes", lambda: self._inserer(lot))
+        except PyMongoError:
+            self._remettre_en_file(lot)
+            return
+
+        # Mises à jour indépendantes : l'échec de l'une n'empêche pas les autres
+        mises_a_jour = [
+            ("Compteurs des idées",
+             lambda: self.db.idees.bulk_write(operations_compteurs_lot(inseres), ordered=False)),
+            ("Progression", lambda: self._ecrire_operations(
+                self.db.progression, operations_progression_lot(self.db, inseres))),
+            ("Activité", lambda: self.db.activite.bulk_write(operations_activite(
+                "votes", [(vote["date_vote"], vote["id_question"]) for vote in inseres]
+            ), ordered=False)),
+            ("Segments", lambda: self._ecrire_operations(
+                self.db.stats_segment, operations_segments_lot(inseres, segments_navigateurs))),
+        ]
+        for description, mise_a_jour in (mises_a_jour if inseres else []):
+            try:
+                self._reessayer(description, mise_a_jour)
+            except Exception as e:
+                # Compteurs en retard sur vote, réparables par les commandes reconstruire-* d'admin.py
+                print(f"❌ {description} : mise à jour de {len(inseres)} vote(s) échouée ({e})")
+                self._incrementer("mises_a_jour_echouees")
+        duree = time.perf_counter() - debut
+
+        with self._verrou:
+            self._compteurs["lots"] += 1
+            self._compteurs["ecrits"] += len(inseres)
+            self._latence_derniere = duree
+            self._latence_max = max(self._latence_max, duree)
+
+        if inseres and self.apres_ecriture is not None:
+            try:
+                self.apres_ecriture()
+            except Exception as e:
+                print(f"❌ Erreur après l'écriture de {len(inseres)} vote(s): {e}")
+
+    @staticmethod
+    def _ecrire_operations(collection, operations):
+        """bulk_write non ordonné, sauf liste vide"""
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+
+    def arreter(self, delai=10.0):
+        """Écrire les votes en attente et arrêter le thread"""
+        self._arret.set()
+        self._thread.join(delai)
+
+    def statistiques(self):
+        """État du thread, profondeur de file, votes écrits, échecs, reprises et latence des lots"""
+        with self._verrou:
+            return {
+                "actif": self._thread.is_alive(),
+                "profondeur": self._file.qsize(),
+                "recus": self._compteurs["recus"],
+                "ecrits": self._compteurs["ecrits"],
+                "echecs": self._compteurs["echecs"],
+                "lots": self._compteurs["lots"],
+                "ecritures_directes": self._compteurs["ecritures_directes"],
+                "reprises": self._compteurs["reprises"],
+                "remis_en_file": self._compteurs["remis_en_file"],
+                "mises_a_jour_echouees": self._compteurs["mises_a_jour_echouees"],
+                "latence_derniere_ms": self._latence_derniere * 1000,
+                "latence_max_ms": self._latence_max * 1000,
+            }
+
+
+def charger_stats_idees(db, question_id):
+    """Idées d'une question ayant participé à au moins un vote, avec leurs compteurs"""
+    return list(db.idees.find(
+        {"id_question": question_id, "apparitions": {"$gt": 0}},
+        {
+            "idee_texte": 1, "creer_par_utilisateur": 1,
+            "sentiment_score": 1, "sentiment_label": 1,
+            "victoires": 1, "defaites": 1, "apparitions": 1
+        }
+    ))
+
+
+def reconstruire_stats_idees(db, question_ids=None):
+    """Recalculer les compteurs des idées à partir de la collection vote"""
+    filtre = {"id_question": {"$in": list(question_ids)}} if question_ids is not None else {}
+
+    victoires = {
+        r["_id"]: r["nombre"]
+        for r in db.vote.aggregate([
+            {"$match": filtre},
+            {"$group": {"_id": "$id_idee_gagnant", "nombre": {"$sum": 1}}}
+        ])
+    }
+    defaites = {
+        r["_id"]: r["nombre"]
+        for r in db.vote.aggregate([
+            {"$match": filtre},
+            {"$group": {"_id": "$id_idee_perdant", "nombre": {"$sum": 1}}}
+        ])
+    }
+
+    total = 0
+    operations = []
+    for idee in db.idees.find(filtre, {"_id": 1}):
+        v = victoires.get(idee["_id"], 0)
+        d = defaites.get(idee["_id"], 0)
+        operations.append(UpdateOne(
+            {"_id": idee["_id"]},
+            {"$set": {"victoires": v, "defaites": d, "apparitions": v + d}}
+        ))
+        if len(operations) >= TAILLE_LOT:
+            db.idees.bulk_write(operations, ordered=False)
+            total += len(operations)
+            operations = []
+
+    if operations:
+        db.idees.bulk_write(operations, ordered=False)
+        total += len(operations)
+    return total